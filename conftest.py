@@ -0,0 +1,10 @@
+import pytest
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_call(item):
+    # Let background thumbnails finish before fixtures remove MEDIA_ROOT.
+    yield
+    from posts import thumbnails
+
+    thumbnails.drain()
@@ -0,0 +1,120 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ApiTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.author = User.objects.create_user(
+            username='author', first_name='Лев', last_name='Толстой')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        Group.objects.create(title='Другая', slug='another', description='')
+        cls.posts = [
+            Post.objects.create(
+                text=f'Пост {i}',
+                author=cls.author,
+                group=cls.group if i % 2 else None,
+            )
+            for i in range(5)
+        ]
+        Comment.objects.create(
+            post=cls.posts[0], author=cls.reader, text='Комментарий')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self) -> None:
+        super().setUp()
+        cache.clear()
+
+    def get_json(self, url, data=None):
+        response = self.client.get(url, data)
+        content = b''.join(getattr(response, 'streaming_content', None)
+                           or [response.content])
+        return response, json.loads(content)
+
+    def walk(self, url, data):
+        """Собрать все страницы списка, следуя по курсорам."""
+
+        rows, cursor = [], None
+        while True:
+            params = dict(data, cursor=cursor) if cursor else data
+            response, body = self.get_json(url, params)
+            self.assertTrue(response.streaming)
+            rows += body['results']
+            cursor = body['next']
+            if cursor is None:
+                return rows
+
+    def test_posts_are_paginated_by_cursor(self):
+        """Посты отдаются по курсору без пропусков и повторов."""
+
+        rows = self.walk(reverse('api:posts'), {'limit': 2})
+        self.assertEqual(
+            [row['text'] for row in rows],
+            [f'Пост {i}' for i in reversed(range(5))],
+        )
+        self.assertEqual(rows[0]['author'], 'author')
+        self.assertEqual(rows[0]['comments_count'], 0)
+        self.assertEqual(rows[-1]['comments_count'], 1)
+
+    def test_fields_and_filters(self):
+        """Поля выбираются параметром fields, списки фильтруются."""
+
+        _, body = self.get_json(
+            reverse('api:posts'), {'fields': 'id,group', 'group': 'group'})
+        self.assertEqual(
+            body['results'],
+            [{'id': self.posts[i].pk, 'group': 'group'} for i in (3, 1)],
+        )
+        response, body = self.get_json(
+            reverse('api:posts'), {'fields': 'id,password'})
+        self.assertEqual(response.status_code, 400)
+        response, body = self.get_json(
+            reverse('api:posts'), {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_rows_are_not_instantiated(self):
+        """Строки читаются через values() одним запросом."""
+
+        with self.assertNumQueries(1):
+            self.get_json(reverse('api:posts'))
+
+    def test_other_resources(self):
+        """Группы, комментарии, подписки и профили."""
+
+        groups = self.walk(reverse('api:groups'), {'limit': 1})
+        self.assertEqual(
+            [group['slug'] for group in groups], ['another', 'group'])
+
+        _, body = self.get_json(
+            reverse('api:comments', args=[self.posts[0].pk]))
+        self.assertEqual(body['results'][0]['author'], 'reader')
+
+        _, body = self.get_json(reverse('api:follows'), {'user': 'reader'})
+        self.assertEqual(body['results'][0]['author'], 'author')
+
+        _, body = self.get_json(
+            reverse('api:profile', args=['author']),
+            {'fields': 'username,posts_count,followers_count'},
+        )
+        self.assertEqual(
+            body,
+            {'username': 'author', 'posts_count': 5, 'followers_count': 1},
+        )
+        response, _ = self.get_json(reverse('api:profile', args=['nobody']))
+        self.assertEqual(response.status_code, 404)
+
+        _, body = self.get_json(reverse('api:post', args=[self.posts[0].pk]))
+        self.assertEqual(body['text'], 'Пост 0')
+        self.assertIsNone(body['image'])
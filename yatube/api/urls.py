@@ -0,0 +1,18 @@
+from django.urls import path
+
+from . import views
+
+app_name = 'api'
+
+urlpatterns = [
+    path('v1/posts/', views.posts, name='posts'),
+    path('v1/posts/<int:post_id>/', views.post, name='post'),
+    path(
+        'v1/posts/<int:post_id>/comments/',
+        views.comments,
+        name='comments'
+    ),
+    path('v1/groups/', views.groups, name='groups'),
+    path('v1/follows/', views.follows, name='follows'),
+    path('v1/profiles/<str:username>/', views.profile, name='profile'),
+]
@@ -0,0 +1,250 @@
+"""Read-only JSON API, version 1.
+
+Rows are projected with ``values()`` instead of building model
+instances, and list responses are written to the client row by row from
+a server-side cursor, so a page of any size never sits in memory. Lists
+are paginated with opaque keyset cursors like the HTML feeds, and
+``?fields=a,b`` narrows every row to the named fields.
+"""
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+
+from posts.models import Comment, Follow, Group, Post, User
+from posts.utils import dump_cursor, keyset_queryset, load_cursor
+
+
+class BadRequest(Exception):
+    pass
+
+
+def cursor_value(value):
+    # DjangoJSONEncoder rounds datetimes to milliseconds, which would
+    # make the cursor skip or repeat rows.
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+def media_url(name):
+    return default_storage.url(name) if name else None
+
+
+class Resource:
+    """A read-only projection of a queryset.
+
+    ``fields`` maps output names to ``values()`` lookups and ``keys`` is
+    the ``(value, unique id)`` pair lists are ordered and paginated by.
+    ``filters`` maps query parameters to lookups, ``converters`` turns
+    raw column values into output values.
+    """
+
+    def __init__(self, queryset, fields, keys=('pub_date', 'id'),
+                 ascending=False, filters=None, converters=None):
+        self.queryset = queryset
+        self.fields = fields
+        self.keys = keys
+        self.ascending = ascending
+        self.filters = filters or {}
+        self.converters = converters or {}
+
+    def selected(self, request):
+        names = request.GET.get('fields')
+        if not names:
+            return list(self.fields)
+        names = names.split(',')
+        unknown = set(names) - set(self.fields)
+        if unknown:
+            raise BadRequest(f'Unknown fields: {", ".join(sorted(unknown))}')
+        return names
+
+    def rows(self, queryset, names, *extra):
+        lookups = {self.fields[name] for name in names} | set(extra)
+        return queryset.values(*lookups)
+
+    def serialize(self, row, names):
+        item = {}
+        for name in names:
+            value = row[self.fields[name]]
+            convert = self.converters.get(name)
+            item[name] = convert(value) if convert else value
+        return item
+
+    def filter(self, request, queryset):
+        lookups = {
+            self.filters[param]: value
+            for param, value in request.GET.items() if param in self.filters
+        }
+        return queryset.filter(**lookups)
+
+    def limit(self, request):
+        try:
+            limit = int(request.GET.get('limit', settings.API_PAGE_SIZE))
+        except ValueError:
+            raise BadRequest('limit must be an integer')
+        return min(max(limit, 1), settings.API_MAX_PAGE_SIZE)
+
+    def position(self, request):
+        cursor = request.GET.get('cursor')
+        if not cursor:
+            return None
+        model = self.queryset.model
+        try:
+            values = load_cursor(cursor)
+            if len(values) != len(self.keys):
+                raise ValueError(cursor)
+            return tuple(
+                model._meta.get_field(key).to_python(value)
+                for key, value in zip(self.keys, values)
+            )
+        except (ValueError, TypeError, ValidationError):
+            raise BadRequest('Malformed cursor')
+
+    def list(self, request, queryset=None):
+        """Stream one page of the list as ``{"results": [...], "next"}``."""
+
+        if queryset is None:
+            queryset = self.queryset
+        names = self.selected(request)
+        limit = self.limit(request)
+        rows = keyset_queryset(
+            self.rows(self.filter(request, queryset), names, *self.keys),
+            self.keys,
+            self.position(request),
+            reverse=self.ascending,
+        )[:limit + 1]
+        return StreamingHttpResponse(
+            self.stream(rows.iterator(), names, limit),
+            content_type='application/json',
+        )
+
+    def stream(self, rows, names, limit):
+        yield '{"results": ['
+        cursor = previous = None
+        for number, row in enumerate(rows):
+            if number == limit:
+                cursor = dump_cursor([
+                    cursor_value(previous[key]) for key in self.keys])
+                break
+            separator = ', ' if number else ''
+            yield separator + json.dumps(
+                self.serialize(row, names), cls=DjangoJSONEncoder)
+            previous = row
+        yield f'], "next": {json.dumps(cursor)}}}'
+
+    def detail(self, request, queryset):
+        names = self.selected(request)
+        row = self.rows(queryset, names).first()
+        if row is None:
+            return JsonResponse({'detail': 'Not found'}, status=404)
+        return JsonResponse(self.serialize(row, names))
+
+
+POSTS = Resource(
+    Post.objects.all(),
+    {
+        'id': 'id',
+        'text': 'text',
+        'pub_date': 'pub_date',
+        'updated_at': 'updated_at',
+        'author': 'author__username',
+        'group': 'group__slug',
+        'image': 'image',
+        'comments_count': 'comments_count',
+    },
+    filters={'author': 'author__username', 'group': 'group__slug'},
+    converters={'image': media_url},
+)
+
+COMMENTS = Resource(
+    Comment.objects.all(),
+    {
+        'id': 'id',
+        'post': 'post_id',
+        'author': 'author__username',
+        'text': 'text',
+        'created': 'created',
+    },
+    keys=('created', 'id'),
+)
+
+GROUPS = Resource(
+    Group.objects.all(),
+    {
+        'id': 'id',
+        'title': 'title',
+        'slug': 'slug',
+        'description': 'description',
+    },
+    keys=('slug', 'id'),
+    ascending=True,
+)
+
+# Follows have no date, so the id doubles as the ordering value.
+FOLLOWS = Resource(
+    Follow.objects.all(),
+    {
+        'id': 'id',
+        'user': 'user__username',
+        'author': 'author__username',
+    },
+    keys=('id', 'id'),
+    filters={'user': 'user__username', 'author': 'author__username'},
+)
+
+PROFILES = Resource(
+    User.objects.all(),
+    {
+        'id': 'id',
+        'username': 'username',
+        'first_name': 'first_name',
+        'last_name': 'last_name',
+        'posts_count': 'counters__posts_count',
+        'followers_count': 'counters__followers_count',
+        'following_count': 'counters__following_count',
+    },
+)
+
+
+def api_view(view):
+    """Answer ``BadRequest`` raised by ``view`` with a JSON 400."""
+
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except BadRequest as error:
+            return JsonResponse({'detail': str(error)}, status=400)
+
+    return wrapper
+
+
+@api_view
+def posts(request):
+    return POSTS.list(request)
+
+
+@api_view
+def post(request, post_id):
+    return POSTS.detail(request, Post.objects.filter(pk=post_id))
+
+
+@api_view
+def comments(request, post_id):
+    return COMMENTS.list(request, Comment.objects.filter(post_id=post_id))
+
+
+@api_view
+def groups(request):
+    return GROUPS.list(request)
+
+
+@api_view
+def follows(request):
+    return FOLLOWS.list(request)
+
+
+@api_view
+def profile(request, username):
+    return PROFILES.detail(request, User.objects.filter(username=username))
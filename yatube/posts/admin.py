@@ -1,9 +1,58 @@
+import hashlib
+
+from django.conf import settings
 from django.contrib import admin
+from django.contrib.admin.views.main import ChangeList
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connection
+from django.utils.functional import cached_property
 
+from . import search
 from .models import Comment, Follow, Group, Post
 
 
-class PostAdmin(admin.ModelAdmin):
+class CachedCountPaginator(Paginator):
+    """Paginator remembering ``COUNT(*)`` of a changelist for a while.
+
+    Counting millions of rows on every changelist page costs more than
+    the page itself; a count a few minutes old is fine for the admin.
+    """
+
+    @cached_property
+    def count(self):
+        query = str(self.object_list.query).encode()
+        key = f'admin:count:{hashlib.md5(query).hexdigest()}'
+        count = cache.get(key)
+        if count is None:
+            count = super().count
+            cache.set(key, count, settings.ADMIN_COUNT_TIMEOUT)
+        return count
+
+
+class ProjectedChangeList(ChangeList):
+    """Changelist loading only the ``list_only`` fields of each row."""
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        if self.model_admin.list_only:
+            queryset = queryset.only(*self.model_admin.list_only)
+        return queryset
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Changelist settings for tables with millions of rows."""
+
+    paginator = CachedCountPaginator
+    show_full_result_count = False
+    empty_value_display = '-пусто-'
+    list_only = None
+
+    def get_changelist(self, request, **kwargs):
+        return ProjectedChangeList
+
+
+class PostAdmin(LargeTableAdmin):
     list_display = (
         'pk',
         'text',
@@ -11,12 +60,39 @@ class PostAdmin(admin.ModelAdmin):
         'author',
         'group',
     )
+    list_select_related = ('author', 'group')
+    list_only = (
+        'text',
+        'pub_date',
+        # Saved by list_editable: a deferred auto_now field is not written.
+        'updated_at',
+        'author',
+        'author__username',
+        'group',
+        'group__title',
+    )
+    raw_id_fields = ('author',)
 
+    # Searched through the full-text index, see get_search_results.
     search_fields = ('text',)
     list_filter = ('pub_date',)
-    empty_value_display = '-пусто-'
+    date_hierarchy = 'pub_date'
     list_editable = ('group',)
 
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        formfield = super().formfield_for_foreignkey(
+            db_field, request, **kwargs)
+        if db_field.name == 'group':
+            # Groups are few: list them once instead of once per
+            # editable row of the changelist.
+            formfield.choices = list(iter(formfield.choices))
+        return formfield
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term or not search.is_supported(connection):
+            return super().get_search_results(request, queryset, search_term)
+        return search.filter_matching(queryset, search_term), False
+
 
 class GroupAdmin(admin.ModelAdmin):
     list_display = (
@@ -30,7 +106,7 @@ class GroupAdmin(admin.ModelAdmin):
     list_editable = ('description',)
 
 
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(LargeTableAdmin):
     list_display = (
         'pk',
         'post',
@@ -38,14 +114,26 @@ class CommentAdmin(admin.ModelAdmin):
         'text',
         'created',
     )
-    search_fields = ('author',)
-    empty_value_display = '-пусто-'
+    list_select_related = ('post', 'author')
+    list_only = (
+        'text',
+        'created',
+        'post',
+        'post__text',
+        'author',
+        'author__username',
+    )
+    raw_id_fields = ('post', 'author')
+    search_fields = ('=author__username',)
+    date_hierarchy = 'created'
     list_editable = ('text',)
 
 
-class FollowAdmin(admin.ModelAdmin):
+class FollowAdmin(LargeTableAdmin):
     list_display = ('user', 'author',)
-    search_fields = ('user', 'author',)
+    list_select_related = ('user', 'author')
+    raw_id_fields = ('user', 'author')
+    search_fields = ('=user__username', '=author__username')
 
 
 admin.site.register(Post, PostAdmin)
@@ -1,5 +1,11 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class PostsConfig(AppConfig):
     name = 'posts'
+
+    def ready(self):
+        from . import invalidation, signals  # noqa: F401
+        from .search import restore_triggers
+        post_migrate.connect(restore_triggers, sender=self)
@@ -0,0 +1,104 @@
+"""Denormalized counters.
+
+``Post.comments_count`` and ``UserCounter`` replace ``COUNT`` queries on
+every page. They are changed with ``F()`` expressions by the signal
+handlers, so concurrent writers never overwrite each other, and can be
+rebuilt from scratch with ``manage.py recount``.
+"""
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Comment, Follow, Post, User, UserCounter
+
+USER_COUNTERS = {
+    'posts_count': (Post, 'author'),
+    'followers_count': (Follow, 'author'),
+    'following_count': (Follow, 'user'),
+}
+
+
+def count_of(model, field):
+    """Correlated subquery counting ``model`` rows pointing at the row."""
+
+    rows = model.objects \
+        .filter(**{field: OuterRef('pk')}) \
+        .order_by() \
+        .values(field) \
+        .annotate(count=Count('pk')) \
+        .values('count')
+    return Coalesce(Subquery(rows), 0)
+
+
+def change_comments_count(post_id, delta):
+    Post.objects \
+        .filter(pk=post_id) \
+        .update(
+            comments_count=F('comments_count') + delta,
+            # updated_at doubles as the Last-Modified of post_detail,
+            # which lists the comments: a comment modifies the page.
+            updated_at=timezone.now(),
+        )
+
+
+def change_user_counters(user_id, **deltas):
+    updated = UserCounter.objects \
+        .filter(user_id=user_id) \
+        .update(**{
+            field: F(field) + delta for field, delta in deltas.items()
+        })
+    if not updated:
+        recount_users(User.objects.filter(pk=user_id))
+
+
+def get_counters(user):
+    """Return counters of ``user``, computing them on first access."""
+
+    try:
+        return user.counters
+    except UserCounter.DoesNotExist:
+        recount_users(User.objects.filter(pk=user.pk))
+        return UserCounter.objects.get(user=user)
+
+
+def recount_posts(posts):
+    """Fix ``comments_count`` of ``posts``; return number of fixed rows."""
+
+    stale = list(
+        posts
+        .annotate(actual=count_of(Comment, 'post'))
+        .exclude(comments_count=F('actual'))
+        .only('pk')
+    )
+    for post in stale:
+        post.comments_count = post.actual
+    Post.objects.bulk_update(stale, ['comments_count'])
+    return len(stale)
+
+
+def recount_users(users):
+    """Fix ``UserCounter`` rows of ``users``; return number of fixed rows."""
+
+    users = users.annotate(**{
+        f'actual_{field}': count_of(model, related)
+        for field, (model, related) in USER_COUNTERS.items()
+    })
+    stored = UserCounter.objects.in_bulk(
+        [user.pk for user in users])
+    missing, stale = [], []
+    for user in users:
+        actual = {
+            field: getattr(user, f'actual_{field}')
+            for field in USER_COUNTERS
+        }
+        counter = stored.get(user.pk)
+        if counter is None:
+            missing.append(UserCounter(user=user, **actual))
+            continue
+        if any(getattr(counter, f) != v for f, v in actual.items()):
+            for field, value in actual.items():
+                setattr(counter, field, value)
+            stale.append(counter)
+    UserCounter.objects.bulk_create(missing, ignore_conflicts=True)
+    UserCounter.objects.bulk_update(stale, list(USER_COUNTERS))
+    return len(missing) + len(stale)
@@ -1,6 +1,8 @@
 from django import forms
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
 
-from . import models
+from . import models, uploads
 
 
 class PostForm(forms.ModelForm):
@@ -9,6 +11,28 @@ class PostForm(forms.ModelForm):
         model = models.Post
         fields = ('text', 'group', 'image')
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # A new image is checked from its header before ImageField opens
+        # it; a rejected file is dropped so that it is never decoded.
+        self.image_error = None
+        upload = self.files.get('image')
+        if upload:
+            try:
+                uploads.check_upload(upload)
+            except ValidationError as error:
+                self.image_error = error
+                self.files = self.files.copy()
+                del self.files['image']
+
+    def clean_image(self):
+        if self.image_error is not None:
+            raise self.image_error
+        image = self.cleaned_data['image']
+        if isinstance(image, UploadedFile):
+            image = uploads.normalize(image)
+        return image
+
 
 class CommentForm(forms.ModelForm):
 
@@ -0,0 +1,76 @@
+"""Generation counters for cache invalidation.
+
+A cache key that embeds ``get_version(*names)`` goes stale as soon as
+``bump_generation`` is called for one of the names, so cached values can
+live long without being deleted one by one. Names are built with the
+helpers below; ``posts.invalidation`` bumps them on every write.
+"""
+import time
+
+from django.core.cache import cache
+
+KEY = 'generation:{}'
+
+FEED = 'feed'
+
+
+def group_generation(slug):
+    return f'group:{slug}'
+
+
+def author_generation(user_id):
+    return f'author:{user_id}'
+
+
+def post_generation(post_id):
+    return f'post:{post_id}'
+
+
+def follower_generation(user_id):
+    return f'follower:{user_id}'
+
+
+def get_generations(*names):
+    """Return the current counters of ``names`` in one cache round trip."""
+
+    keys = [KEY.format(name) for name in names]
+    values = cache.get_many(keys)
+    for key in keys:
+        if key not in values:
+            # Start from the clock so a counter evicted from the cache
+            # never returns to a value some stale entry was stored under.
+            cache.add(key, time.time_ns(), None)
+            values[key] = cache.get(key)
+    return [values[key] for key in keys]
+
+
+def get_generation(name):
+    return get_generations(name)[0]
+
+
+def get_version(*names):
+    """Return a key fragment that changes when any of ``names`` is bumped."""
+
+    return '.'.join(str(value) for value in get_generations(*names))
+
+
+def bump_generation(*names):
+    for name in names:
+        key = KEY.format(name)
+        try:
+            cache.incr(key)
+        except ValueError:
+            get_generation(name)
+
+
+def tag_request(request, *names):
+    """Mark the page being rendered as depending on ``names``.
+
+    Versions are read now, before the page is queried, so a write that
+    lands while the page renders leaves it stale rather than cached as
+    fresh. ``AnonymousPageCacheMiddleware`` stores only tagged pages.
+    """
+
+    tags = getattr(request, 'cache_tags', {})
+    tags.update(zip(names, get_generations(*names)))
+    request.cache_tags = tags
@@ -0,0 +1,199 @@
+"""Bump cache generations on every write that changes rendered pages.
+
+Post cards show the author, group link and comment count, so a post or
+comment write bumps the global feed and the feeds of its author and
+group; the post's own generation covers ``post_detail``. Follows change
+the follower's subscription feed and the author's profile. Renaming or
+deleting a group also bumps the profiles of the authors posting in it.
+
+Deleting a post deletes its comments first. The comment handlers here
+and in ``posts.signals`` skip that cascade (``post_being_deleted``): the
+post's own handlers cover it, at a cost that does not grow with the
+number of comments. Likewise the counters of a user being deleted
+(``user_being_deleted``) are deleted with the user, not updated.
+"""
+import threading
+
+from django.db.models.signals import (post_delete, post_init, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+
+from .generations import (FEED, author_generation, bump_generation,
+                          follower_generation, group_generation,
+                          post_generation)
+from .models import Comment, Follow, Group, Post, User
+
+_deleting = threading.local()
+
+DEFERRED = object()
+
+
+def group_slugs(*group_ids):
+    ids = {group_id for group_id in group_ids if group_id is not None}
+    if not ids:
+        return []
+    return Group.objects \
+        .filter(pk__in=ids) \
+        .values_list('slug', flat=True)
+
+
+def bump_post(post_id, author_id, *group_ids):
+    bump_generation(
+        FEED,
+        post_generation(post_id),
+        author_generation(author_id),
+        *(group_generation(slug) for slug in group_slugs(*group_ids)),
+    )
+
+
+def bump_posts(rows):
+    """``bump_post`` for ``(post_id, author_id, group_id)`` rows at once."""
+
+    rows = list(rows)
+    if not rows:
+        return
+    bump_generation(
+        FEED,
+        *(post_generation(post_id) for post_id, _, _ in rows),
+        *{author_generation(author_id) for _, author_id, _ in rows},
+        *(group_generation(slug) for slug in group_slugs(
+            *(group_id for _, _, group_id in rows))),
+    )
+
+
+def bump_image(image_name):
+    """``bump_post`` for every post showing the image ``image_name``."""
+
+    bump_posts(
+        Post.objects
+        .filter(image=image_name)
+        .values_list('pk', 'author_id', 'group_id')
+    )
+
+
+@receiver(post_init, sender=Post)
+def remember_group(sender, instance, **kwargs):
+    # A post moved to another group leaves a stale card in the old one.
+    # A deferred group_id is not loaded here, which would cost a query
+    # per row, but in pre_save, once per saved post.
+    if 'group_id' in instance.get_deferred_fields():
+        instance._initial_group_id = DEFERRED
+    else:
+        instance._initial_group_id = instance.group_id
+
+
+@receiver(pre_save, sender=Post)
+def load_initial_group(sender, instance, **kwargs):
+    if instance._initial_group_id is DEFERRED:
+        instance._initial_group_id = Post.objects \
+            .filter(pk=instance.pk) \
+            .values_list('group_id', flat=True) \
+            .first()
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, **kwargs):
+    bump_post(
+        instance.pk,
+        instance.author_id,
+        instance.group_id,
+        instance._initial_group_id,
+    )
+    instance._initial_group_id = instance.group_id
+
+
+def post_being_deleted(post_id):
+    """Return whether ``post_id`` is being deleted by this thread."""
+
+    return post_id in getattr(_deleting, 'posts', ())
+
+
+def user_being_deleted(user_id):
+    """Return whether ``user_id`` is being deleted by this thread."""
+
+    return user_id in getattr(_deleting, 'users', ())
+
+
+@receiver(pre_delete, sender=Post)
+def mark_deleted_post(sender, instance, **kwargs):
+    _deleting.posts = getattr(_deleting, 'posts', set()) | {instance.pk}
+
+
+@receiver(pre_delete, sender=User)
+def mark_deleted_user(sender, instance, **kwargs):
+    _deleting.users = getattr(_deleting, 'users', set()) | {instance.pk}
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    _deleting.users.discard(instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    bump_post(instance.pk, instance.author_id, instance.group_id)
+    _deleting.posts.discard(instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comment_changed(sender, instance, **kwargs):
+    if post_being_deleted(instance.post_id):
+        return
+    post = Post.objects \
+        .filter(pk=instance.post_id) \
+        .values('author_id', 'group_id') \
+        .first()
+    if post is None:
+        # The post is being deleted and bumps everything itself.
+        bump_generation(post_generation(instance.post_id))
+        return
+    bump_post(instance.post_id, post['author_id'], post['group_id'])
+
+
+@receiver(pre_save, sender=Group)
+def remember_slug(sender, instance, **kwargs):
+    instance._initial_slug = Group.objects \
+        .filter(pk=instance.pk) \
+        .values_list('slug', flat=True) \
+        .first()
+
+
+def group_authors(group_id):
+    return Post.objects \
+        .filter(group_id=group_id) \
+        .order_by() \
+        .values_list('author_id', flat=True) \
+        .distinct()
+
+
+@receiver(pre_delete, sender=Group)
+def remember_authors(sender, instance, **kwargs):
+    # The posts lose their group before post_delete.
+    instance._author_ids = list(group_authors(instance.pk))
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    initial = getattr(instance, '_initial_slug', None)
+    slugs = {instance.slug, initial}
+    # Profiles link to the groups of their cards; their ETags cover only
+    # the author generation, so a new slug bumps the authors' too.
+    author_ids = getattr(instance, '_author_ids', ())
+    if initial and initial != instance.slug:
+        author_ids = group_authors(instance.pk)
+    bump_generation(
+        FEED,
+        *(group_generation(slug) for slug in slugs if slug),
+        *(author_generation(author_id) for author_id in author_ids),
+    )
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def follow_changed(sender, instance, **kwargs):
+    bump_generation(
+        follower_generation(instance.user_id),
+        author_generation(instance.author_id),
+    )
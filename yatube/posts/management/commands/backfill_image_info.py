@@ -0,0 +1,85 @@
+from collections import defaultdict
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.invalidation import bump_posts
+from posts.models import Post, post_image_storage
+from posts.uploads import describe_file
+
+
+class Command(BaseCommand):
+    help = (
+        'Store the size and blurred placeholder of existing post images, '
+        'so that pages are rendered without opening the files.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Posts read per batch.',
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Describe every image again, not only the missing ones.',
+        )
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='')
+        if not options['all']:
+            posts = posts.filter(image_width__isnull=True)
+        images = updated = failed = 0
+        started = perf_counter()
+        last_pk = 0
+        while True:
+            batch = list(
+                posts
+                .filter(pk__gt=last_pk)
+                .order_by('pk')
+                .values('pk', 'image', 'author_id', 'group_id')
+                [:options['batch_size']]
+            )
+            if not batch:
+                break
+            last_pk = batch[-1]['pk']
+            # Only this batch is kept: an image shared with posts of other
+            # batches is described once per batch.
+            by_image = defaultdict(list)
+            for row in batch:
+                by_image[row['image']].append(row)
+            done = []
+            with transaction.atomic():
+                for name, rows in by_image.items():
+                    fields = self.describe(name)
+                    images += 1
+                    if fields is None:
+                        failed += len(rows)
+                        continue
+                    # update() skips the signals that would describe the
+                    # image again; caches are bumped below.
+                    Post.objects \
+                        .filter(pk__in=[row['pk'] for row in rows]) \
+                        .update(**fields)
+                    done += rows
+            updated += len(done)
+            bump_posts(
+                (row['pk'], row['author_id'], row['group_id'])
+                for row in done
+            )
+        elapsed = perf_counter() - started
+        self.stderr.write(
+            f'Described {images} images in {elapsed:.1f}s '
+            f'({images / (elapsed or 1):.0f} images/s)')
+        self.stdout.write(f'Updated posts: {updated}, failed: {failed}')
+
+    def describe(self, name):
+        try:
+            with post_image_storage.open(name) as file:
+                return describe_file(file)
+        except Exception as error:
+            self.stderr.write(f'{name}: {error}')
+            return None
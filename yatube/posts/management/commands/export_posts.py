@@ -0,0 +1,185 @@
+import gzip
+import json
+import sys
+from contextlib import nullcontext
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+
+from posts.models import Comment, Follow, Group, Post
+
+# model name: (queryset, {output field: values() lookup}, date lookup,
+#              {filter option: lookup})
+EXPORTS = {
+    'group': (
+        Group.objects.all(),
+        {
+            'id': 'id',
+            'title': 'title',
+            'slug': 'slug',
+            'description': 'description',
+        },
+        None,
+        {'group': 'slug'},
+    ),
+    'post': (
+        Post.objects.all(),
+        {
+            'id': 'id',
+            'text': 'text',
+            'pub_date': 'pub_date',
+            'updated_at': 'updated_at',
+            'author': 'author__username',
+            'group': 'group__slug',
+            'image': 'image',
+        },
+        'pub_date',
+        {'group': 'group__slug', 'author': 'author__username'},
+    ),
+    'comment': (
+        Comment.objects.all(),
+        {
+            'id': 'id',
+            'post': 'post_id',
+            'author': 'author__username',
+            'text': 'text',
+            'created': 'created',
+        },
+        'created',
+        {'group': 'post__group__slug', 'author': 'post__author__username'},
+    ),
+    'follow': (
+        Follow.objects.all(),
+        {
+            'id': 'id',
+            'user': 'user__username',
+            'author': 'author__username',
+        },
+        None,
+        {'author': 'author__username'},
+    ),
+}
+
+
+def to_json(value):
+    # Full precision: DjangoJSONEncoder rounds datetimes to milliseconds.
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def date_option(value):
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise CommandError(f'Not an ISO date and time: {value}')
+    return parsed
+
+
+class Command(BaseCommand):
+    help = (
+        'Stream groups, posts, comments and follows as NDJSON, one '
+        'object with a "model" key per line.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output',
+            default='-',
+            help='File to write, "-" for stdout. A .gz name implies --gzip.',
+        )
+        parser.add_argument(
+            '--gzip',
+            action='store_true',
+            help='Compress the output.',
+        )
+        parser.add_argument(
+            '--models',
+            nargs='+',
+            choices=list(EXPORTS),
+            default=list(EXPORTS),
+            help='Models to export, in this order.',
+        )
+        parser.add_argument(
+            '--since',
+            type=date_option,
+            help='Only posts and comments created at or after this time.',
+        )
+        parser.add_argument(
+            '--until',
+            type=date_option,
+            help='Only posts and comments created before this time.',
+        )
+        parser.add_argument('--group', help='Slug of the group to export.')
+        parser.add_argument(
+            '--author', help='Username of the author to export.')
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=2000,
+            help='Rows fetched from the database at a time.',
+        )
+        parser.add_argument(
+            '--progress-every',
+            type=int,
+            default=100000,
+            help='Report the rate every this many rows.',
+        )
+
+    def handle(self, *args, **options):
+        path = options['output']
+        compress = options['gzip'] or path.endswith('.gz')
+        with self.open(path, compress) as output:
+            started = perf_counter()
+            total = 0
+            for model in options['models']:
+                total += self.export(model, output, options)
+        elapsed = perf_counter() - started
+        self.stderr.write(
+            f'{total} rows in {elapsed:.1f}s, '
+            f'{total / (elapsed or 1):.0f} rows/s')
+
+    def open(self, path, compress):
+        if path == '-':
+            if compress:
+                return gzip.open(sys.stdout.buffer, 'wt', encoding='utf-8')
+            return nullcontext(self.stdout)
+        if compress:
+            return gzip.open(path, 'wt', encoding='utf-8')
+        return open(path, 'w', encoding='utf-8')
+
+    def rows(self, model, options):
+        queryset, fields, date_lookup, filters = EXPORTS[model]
+        for option, lookup in filters.items():
+            if options[option]:
+                queryset = queryset.filter(**{lookup: options[option]})
+        if date_lookup and options['since']:
+            queryset = queryset.filter(**{f'{date_lookup}__gte':
+                                          options['since']})
+        if date_lookup and options['until']:
+            queryset = queryset.filter(**{f'{date_lookup}__lt':
+                                          options['until']})
+        return fields, queryset \
+            .order_by('pk') \
+            .values_list(*fields.values()) \
+            .iterator(chunk_size=options['chunk_size'])
+
+    def export(self, model, output, options):
+        fields, rows = self.rows(model, options)
+        names = list(fields)
+        every = options['progress_every']
+        started = perf_counter()
+        count = 0
+        for count, row in enumerate(rows, 1):
+            record = {'model': model, **dict(zip(names, row))}
+            output.write(json.dumps(
+                record, ensure_ascii=False, default=to_json) + '\n')
+            if count % every == 0:
+                self.report(model, count, started)
+        self.report(model, count, started)
+        return count
+
+    def report(self, model, count, started):
+        elapsed = perf_counter() - started
+        self.stderr.write(
+            f'{model}: {count} rows, {count / (elapsed or 1):.0f} rows/s')
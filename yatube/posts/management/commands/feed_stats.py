@@ -0,0 +1,100 @@
+from collections import defaultdict
+from statistics import mean, median
+from time import perf_counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from posts.models import Follow, Post, User
+from posts.timeline import TimelinePaginator
+
+
+class Command(BaseCommand):
+    help = (
+        'Report how the follower threshold of the hybrid feed trades '
+        'fan-out writes for read-time merges.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threshold',
+            dest='thresholds',
+            type=int,
+            nargs='+',
+            default=[settings.FEED_PULL_THRESHOLD],
+            help='Follower thresholds to compare.',
+        )
+        parser.add_argument(
+            '--sample',
+            type=int,
+            default=100,
+            help='Number of followers whose feeds are timed.',
+        )
+
+    def handle(self, *args, **options):
+        followers = dict(
+            Follow.objects
+            .values('author_id')
+            .annotate(count=Count('user_id'))
+            .values_list('author_id', 'count')
+        )
+        posts = dict(
+            Post.objects
+            .values('author_id')
+            .annotate(count=Count('pk'))
+            .values_list('author_id', 'count')
+        )
+        total_posts = sum(posts.values()) or 1
+        users = list(
+            Follow.objects
+            .values_list('user_id', flat=True)
+            .order_by('user_id')
+            .distinct()[:options['sample']]
+        )
+        following = defaultdict(list)
+        for user_id, author_id in Follow.objects \
+                .filter(user_id__in=users) \
+                .values_list('user_id', 'author_id'):
+            following[user_id].append(author_id)
+
+        self.stdout.write(
+            'threshold  pulled  rows/post  sources/read  '
+            'median ms  max ms'
+        )
+        for threshold in options['thresholds']:
+            pulled = {
+                author for author, count in followers.items()
+                if count > threshold
+            }
+            pushed_rows = sum(
+                posts.get(author, 0) * count
+                for author, count in followers.items()
+                if author not in pulled
+            )
+            sources = [
+                1 + sum(author in pulled for author in following[user])
+                for user in users
+            ]
+            timings = self.measure(users, threshold)
+            self.stdout.write(
+                f'{threshold:>9}  {len(pulled):>6}  '
+                f'{pushed_rows / total_posts:>9.1f}  '
+                f'{mean(sources or [0]):>12.1f}  '
+                f'{median(timings or [0]):>9.2f}  '
+                f'{max(timings or [0]):>6.2f}'
+            )
+
+    def measure(self, users, threshold):
+        timings = []
+        for user_id in users:
+            paginator = TimelinePaginator(
+                Post.objects.all(),
+                settings.RECORDS_PER_PAGE,
+                user=User(pk=user_id),
+                threshold=threshold,
+            )
+            started = perf_counter()
+            paginator.get_cursor_page()
+            timings.append((perf_counter() - started) * 1000)
+        return timings
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from posts import search
+from posts.generations import FEED, bump_generation
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Recreate the search triggers and reindex every post.'
+
+    def handle(self, *args, **options):
+        if not search.is_supported(connection):
+            raise CommandError('Full-text search needs SQLite with FTS5.')
+        search.install_triggers(connection)
+        search.rebuild(connection)
+        # Cached result counts are versioned by the feed generation.
+        bump_generation(FEED)
+        self.stdout.write(f'Reindexed posts: {Post.objects.count()}')
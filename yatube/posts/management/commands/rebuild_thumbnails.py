@@ -0,0 +1,147 @@
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from posts import thumbnails, variants
+from posts.invalidation import bump_posts
+from posts.models import Post
+
+
+def rebuild(image_name, force, with_variants):
+    """Render the files of one image; runs in a worker process."""
+
+    made = thumbnails.render(image_name, force)
+    manifest = variants.render(image_name) if with_variants else None
+    return made, manifest
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate the configured thumbnails and variants of every post '
+        'image in worker processes, e.g. after changing their geometry.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=200,
+            help='Posts read per batch.',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count(),
+            help='Worker processes (default: one per CPU).',
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Render files again even if they exist.',
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help=(
+                'File recording the last finished post; an interrupted '
+                'run started with the same file resumes after it.'
+            ),
+        )
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--workers and --batch-size must be positive.')
+        self.force = options['force']
+        checkpoint = options['checkpoint']
+        last_pk = self.read_checkpoint(checkpoint)
+        if last_pk:
+            self.stderr.write(f'Resuming after post {last_pk}')
+        seen = set()
+        self.rendered = self.failed = 0
+        started = perf_counter()
+        # Workers are forked, so that they inherit the configured Django;
+        # they never touch the database, only the files.
+        with ProcessPoolExecutor(
+            max_workers=options['workers'],
+            mp_context=multiprocessing.get_context('fork'),
+        ) as executor:
+            while True:
+                batch = list(
+                    Post.objects
+                    .exclude(image='')
+                    .filter(pk__gt=last_pk)
+                    .order_by('pk')
+                    .values_list('pk', 'image', 'author_id', 'group_id')
+                    [:options['batch_size']]
+                )
+                if not batch:
+                    break
+                names = {name for _, name, _, _ in batch} - seen
+                seen |= names
+                self.rebuild_batch(executor, names)
+                bump_posts(
+                    (pk, author_id, group_id)
+                    for pk, _, author_id, group_id in batch
+                )
+                last_pk = batch[-1][0]
+                self.write_checkpoint(checkpoint, last_pk)
+                elapsed = perf_counter() - started
+                self.stderr.write(
+                    f'Up to post {last_pk}: {self.rendered} images, '
+                    f'{self.failed} failed, '
+                    f'{self.rendered / (elapsed or 1):.1f} images/s')
+        if checkpoint and os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        self.stdout.write(
+            f'Rebuilt images: {self.rendered}, failed: {self.failed}')
+
+    def rebuild_batch(self, executor, names):
+        if self.force:
+            lacking = names
+        else:
+            lacking = set(
+                Post.objects
+                .filter(image__in=names, image_variants='')
+                .values_list('image', flat=True)
+            )
+        # A forked worker must not share an open connection of ours, and
+        # the pool forks them on its first submit.
+        connections.close_all()
+        futures = {
+            executor.submit(rebuild, name, self.force, name in lacking): name
+            for name in sorted(names)
+        }
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                (source, made), manifest = future.result()
+                thumbnails.record(source, made)
+                if manifest is not None:
+                    variants.record(name, manifest)
+            except BrokenProcessPool:
+                raise CommandError(
+                    'A worker process died; run again to resume.')
+            except Exception as error:
+                self.failed += 1
+                self.stderr.write(f'{name}: {error!r}')
+            else:
+                self.rendered += 1
+
+    def read_checkpoint(self, path):
+        if not path or not os.path.exists(path):
+            return 0
+        with open(path) as file:
+            return json.load(file)['last_pk']
+
+    def write_checkpoint(self, path, last_pk):
+        if not path:
+            return
+        # Replaced atomically: a crash never leaves half a checkpoint.
+        with open(f'{path}.tmp', 'w') as file:
+            json.dump({'last_pk': last_pk}, file)
+        os.replace(f'{path}.tmp', path)
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+
+from posts.counters import recount_posts, recount_users
+from posts.media import recount_images
+from posts.models import Post, User
+
+
+class Command(BaseCommand):
+    help = (
+        'Repair drift of denormalized post and user counters and of image '
+        'reference counts.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Rows checked per transaction.',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        for model, recount in ((Post, recount_posts), (User, recount_users)):
+            fixed = 0
+            last_pk = model.objects.aggregate(last=Max('pk'))['last'] or 0
+            for start in range(0, last_pk + 1, batch_size):
+                rows = model.objects.filter(
+                    pk__gte=start, pk__lt=start + batch_size)
+                with transaction.atomic():
+                    fixed += recount(rows)
+            self.stdout.write(
+                f'{model._meta.verbose_name_plural}: fixed {fixed}')
+        self.stdout.write(f'images: fixed {recount_images()}')
@@ -0,0 +1,118 @@
+"""Reference counts of stored post images.
+
+With ``ContentAddressedStorage`` several posts share one file, so a file
+may only be deleted with the last post using it. ``StoredImage`` counts
+the posts per file name; the signal handlers change the counts with
+``F()`` expressions on every save and delete of a post, and a file whose
+count drops to zero is deleted, with its sorl thumbnails and responsive
+variants, once the transaction commits. ``manage.py recount`` rebuilds
+the counts.
+
+``describe`` stores the size and blurred placeholder of a new image on
+its post (see ``posts.uploads``).
+"""
+import logging
+
+from django.db import transaction
+from django.db.models import Count, F
+from sorl import thumbnail
+
+from . import thumbnails, uploads, variants
+from .models import Post, StoredImage, post_image_storage
+
+logger = logging.getLogger(__name__)
+
+
+def add_reference(name):
+    if not name:
+        return
+    StoredImage.objects.bulk_create(
+        [StoredImage(name=name)], ignore_conflicts=True)
+    StoredImage.objects \
+        .filter(name=name) \
+        .update(references=F('references') + 1)
+
+
+def release(name):
+    """Drop a reference to ``name``; delete the file if it was the last."""
+
+    if not name:
+        return
+    StoredImage.objects \
+        .filter(name=name) \
+        .update(references=F('references') - 1)
+    deleted, _ = StoredImage.objects \
+        .filter(name=name, references__lte=0) \
+        .delete()
+    if deleted:
+        transaction.on_commit(lambda: delete_unreferenced(name))
+
+
+def delete_unreferenced(name):
+    # The same content may have been uploaded again in the meantime.
+    if StoredImage.objects.filter(name=name).exists():
+        return
+    try:
+        thumbnail.delete(thumbnails.source_file(name), delete_file=False)
+        post_image_storage.delete(name)
+        variants.delete(name)
+    except Exception:
+        logger.exception('Deleting %s failed', name)
+    thumbnails.forget()
+
+
+def describe(post):
+    """Fill the image size and placeholder fields of ``post``.
+
+    A file just normalized by ``PostForm`` is described already; other
+    files are opened. Unreadable files leave the fields empty.
+    """
+
+    fields = {
+        'image_width': None,
+        'image_height': None,
+        'image_placeholder': '',
+    }
+    image = post.image
+    if image:
+        try:
+            if image._committed:
+                with image.storage.open(image.name) as file:
+                    fields = uploads.describe_file(file)
+            else:
+                fields = getattr(image.file, 'description', None) \
+                    or uploads.describe_file(image.file)
+        except Exception:
+            logger.warning('Cannot describe image %s', image.name,
+                           exc_info=True)
+    for field, value in fields.items():
+        setattr(post, field, value)
+
+
+def recount_images():
+    """Rebuild ``StoredImage`` from posts; return number of fixed rows."""
+
+    actual = dict(
+        Post.objects
+        .exclude(image='')
+        .order_by()
+        .values_list('image')
+        .annotate(count=Count('pk'))
+    )
+    stored = dict(StoredImage.objects.values_list('name', 'references'))
+    stale = [
+        StoredImage(name=name, references=count)
+        for name, count in actual.items() if stored.get(name) != count
+    ]
+    gone = set(stored) - set(actual)
+    with transaction.atomic():
+        StoredImage.objects.bulk_create(
+            [image for image in stale if image.name not in stored])
+        StoredImage.objects.bulk_update(
+            [image for image in stale if image.name in stored],
+            ['references'],
+        )
+        StoredImage.objects.filter(name__in=gone).delete()
+    for name in gone:
+        transaction.on_commit(lambda name=name: delete_unreferenced(name))
+    return len(stale) + len(gone)
@@ -0,0 +1,84 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+from .generations import get_generations
+
+HEADER = 'X-Page-Cache'
+# Headers replayed on a hit along with the content.
+STORED_HEADERS = ('ETag', 'Last-Modified', 'X-Next-Cursor')
+
+
+class AnonymousPageCacheMiddleware:
+    """Serve whole pages to anonymous visitors from the cache.
+
+    Only GET requests without a session cookie are considered, and only
+    responses of views that tagged the request with ``tag_request`` are
+    stored. An entry remembers the versions of its tags; a write that
+    bumps any of them (see ``posts.invalidation``) turns it into a miss.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if (request.method != 'GET'
+                or settings.SESSION_COOKIE_NAME in request.COOKIES):
+            return self.get_response(request)
+
+        key = self.cache_key(request)
+        entry = cache.get(key)
+        if entry is not None and self.is_fresh(entry):
+            response = HttpResponse(
+                entry['content'], content_type=entry['content_type'])
+            response[HEADER] = 'HIT'
+            for header, value in entry['headers'].items():
+                response[header] = value
+            # Validators are normally checked by the view, which a hit
+            # never reaches.
+            return get_conditional_response(
+                request,
+                etag=response.get('ETag'),
+                last_modified=parse_http_date_safe(
+                    response.get('Last-Modified', '')),
+                response=response,
+            )
+
+        response = self.get_response(request)
+        tags = getattr(request, 'cache_tags', None)
+        if tags and self.is_cacheable(response):
+            cache.set(
+                key,
+                {
+                    'content': response.content,
+                    'content_type': response['Content-Type'],
+                    'tags': tags,
+                    'headers': {
+                        header: response[header]
+                        for header in STORED_HEADERS
+                        if response.has_header(header)
+                    },
+                },
+                settings.PAGE_CACHE_TIMEOUT,
+            )
+        response[HEADER] = 'MISS'
+        return response
+
+    def cache_key(self, request):
+        url = request.build_absolute_uri()
+        return f'page:{hashlib.md5(url.encode()).hexdigest()}'
+
+    def is_fresh(self, entry):
+        tags = entry['tags']
+        return get_generations(*tags) == list(tags.values())
+
+    def is_cacheable(self, response):
+        return (
+            response.status_code == 200
+            and not response.streaming
+            and not response.cookies
+        )
@@ -0,0 +1,61 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:05
+
+from django.db import migrations
+
+TABLE = 'posts_post_fts'
+
+CREATE = [
+    f'''
+    CREATE VIRTUAL TABLE {TABLE}
+    USING fts5(text, content='posts_post', content_rowid='id')
+    ''',
+    f'''
+    CREATE TRIGGER {TABLE}_insert AFTER INSERT ON posts_post
+    BEGIN
+        INSERT INTO {TABLE}(rowid, text) VALUES (new.id, new.text);
+    END
+    ''',
+    f'''
+    CREATE TRIGGER {TABLE}_delete AFTER DELETE ON posts_post
+    BEGIN
+        INSERT INTO {TABLE}({TABLE}, rowid, text)
+        VALUES ('delete', old.id, old.text);
+    END
+    ''',
+    f'''
+    CREATE TRIGGER {TABLE}_update AFTER UPDATE OF text ON posts_post
+    BEGIN
+        INSERT INTO {TABLE}({TABLE}, rowid, text)
+        VALUES ('delete', old.id, old.text);
+        INSERT INTO {TABLE}(rowid, text) VALUES (new.id, new.text);
+    END
+    ''',
+    f"INSERT INTO {TABLE}({TABLE}) VALUES ('rebuild')",
+]
+
+DROP = [
+    f'DROP TRIGGER IF EXISTS {TABLE}_insert',
+    f'DROP TRIGGER IF EXISTS {TABLE}_delete',
+    f'DROP TRIGGER IF EXISTS {TABLE}_update',
+    f'DROP TABLE IF EXISTS {TABLE}',
+]
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_post_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(CREATE), run(DROP)),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:46
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def fill_pulled_since(apps, schema_editor):
+    UserCounter = apps.get_model('posts', 'UserCounter')
+    UserCounter.objects \
+        .filter(followers_count__gt=settings.FEED_PULL_THRESHOLD) \
+        .update(pulled_since=timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0020_post_image_size'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usercounter',
+            name='pulled_since',
+            field=models.DateTimeField(blank=True, db_index=True, null=True, verbose_name='Посты подтягиваются в ленты с'),
+        ),
+        migrations.RunPython(fill_pulled_since, migrations.RunPython.noop),
+    ]
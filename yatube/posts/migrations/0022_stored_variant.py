@@ -0,0 +1,48 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:48
+
+import json
+
+from django.db import migrations, models
+
+
+def fill_variants(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    StoredVariant = apps.get_model('posts', 'StoredVariant')
+    manifests = Post.objects \
+        .exclude(image_variants='') \
+        .order_by() \
+        .values_list('image', 'image_variants') \
+        .distinct()
+    StoredVariant.objects.bulk_create(
+        (
+            StoredVariant(source=source, name=name)
+            for source, encoded in manifests.iterator()
+            for files in json.loads(encoded).values()
+            for _, name in files
+        ),
+        batch_size=500,
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0021_usercounter_pulled_since'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredVariant',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=100, verbose_name='Картинка')),
+                ('name', models.CharField(db_index=True, max_length=100, verbose_name='Файл')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='storedvariant',
+            constraint=models.UniqueConstraint(fields=('source', 'name'), name='unique_variant_source_name'),
+        ),
+        migrations.RunPython(fill_variants, migrations.RunPython.noop),
+    ]
@@ -2,8 +2,12 @@ from django.contrib.auth import get_user_model
 from django.db import models
 from django.db.models.fields.related import ForeignKey
 
+from .storage import ContentAddressedStorage
+
 User = get_user_model()
 
+post_image_storage = ContentAddressedStorage()
+
 
 class Group(models.Model):
     title = models.CharField(
@@ -53,14 +57,62 @@ class Post(models.Model):
     image = models.ImageField(
         verbose_name='Картинка',
         upload_to='posts/',
+        storage=post_image_storage,
         blank=True,
         help_text='Загрузите картинку'
     )
+    updated_at = models.DateTimeField(
+        verbose_name='Дата изменения',
+        auto_now=True,
+    )
+    comments_count = models.PositiveIntegerField(
+        verbose_name='Комментариев',
+        default=0,
+        editable=False,
+    )
+    image_variants = models.TextField(
+        verbose_name='Варианты картинки',
+        blank=True,
+        default='',
+        editable=False,
+    )
+    image_width = models.PositiveIntegerField(
+        verbose_name='Ширина картинки',
+        null=True,
+        blank=True,
+        editable=False,
+    )
+    image_height = models.PositiveIntegerField(
+        verbose_name='Высота картинки',
+        null=True,
+        blank=True,
+        editable=False,
+    )
+    image_placeholder = models.TextField(
+        verbose_name='Размытая заглушка картинки',
+        blank=True,
+        default='',
+        editable=False,
+    )
 
     class Meta:
         ordering = ['-pub_date']
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        indexes = [
+            models.Index(
+                fields=['pub_date', 'id'],
+                name='post_pub_date_idx'
+            ),
+            models.Index(
+                fields=['author', 'pub_date', 'id'],
+                name='post_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=['group', 'pub_date', 'id'],
+                name='post_group_pub_date_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.text[:15]
@@ -94,6 +146,16 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ['-created']
+        indexes = [
+            models.Index(
+                fields=['post', 'created', 'id'],
+                name='comment_post_created_idx'
+            ),
+            models.Index(
+                fields=['created', 'id'],
+                name='comment_created_idx'
+            ),
+        ]
 
 
 class Follow(models.Model):
@@ -117,3 +179,125 @@ class Follow(models.Model):
                 name='unique_user_author'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['author', 'user'],
+                name='follow_author_user_idx'
+            ),
+        ]
+
+
+class FeedEntry(models.Model):
+    """Materialized row of a user's subscription feed."""
+
+    user = ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed'
+    )
+
+    author = ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+
+    post = ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='feed_entries'
+    )
+
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-pub_date']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_feed_user_post'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='feed_user_pub_date_idx'
+            ),
+            models.Index(
+                fields=['user', 'author'],
+                name='feed_user_author_idx'
+            ),
+        ]
+
+
+class UserCounter(models.Model):
+    """Denormalized counters of a user, kept up to date by signals."""
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='counters',
+        verbose_name='Пользователь'
+    )
+
+    posts_count = models.PositiveIntegerField(
+        verbose_name='Постов',
+        default=0
+    )
+
+    followers_count = models.PositiveIntegerField(
+        verbose_name='Подписчиков',
+        default=0,
+        db_index=True
+    )
+
+    following_count = models.PositiveIntegerField(
+        verbose_name='Подписок',
+        default=0
+    )
+
+    pulled_since = models.DateTimeField(
+        verbose_name='Посты подтягиваются в ленты с',
+        null=True,
+        blank=True,
+        db_index=True
+    )
+
+
+class StoredImage(models.Model):
+    """Number of posts referencing a stored image file."""
+
+    name = models.CharField(
+        max_length=100,
+        primary_key=True,
+        verbose_name='Файл'
+    )
+
+    references = models.IntegerField(
+        verbose_name='Ссылок',
+        default=0
+    )
+
+
+class StoredVariant(models.Model):
+    """Responsive variant file rendered from a stored image."""
+
+    source = models.CharField(
+        max_length=100,
+        verbose_name='Картинка'
+    )
+
+    name = models.CharField(
+        max_length=100,
+        db_index=True,
+        verbose_name='Файл'
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['source', 'name'],
+                name='unique_variant_source_name'
+            )
+        ]
@@ -0,0 +1,159 @@
+"""Full-text search over post text with SQLite FTS5.
+
+``posts_post_fts`` is an external content FTS5 table over
+``posts_post.text``. Triggers keep it in sync with every write, including
+``bulk_create`` and ``update()`` which bypass model signals. Results are
+ranked by bm25 and paginated by cursor on ``(rank, id)``.
+
+SQLite rebuilds a table to alter it and drops its triggers on the way,
+so they are recreated after every ``migrate``. ``manage.py
+rebuild_search`` repopulates the index from scratch.
+"""
+import re
+
+from django.db import connection, connections
+from django.db.models.expressions import RawSQL
+
+from .generations import FEED
+from .utils import CursorPaginator
+
+TABLE = 'posts_post_fts'
+
+TRIGGERS = (
+    f'''
+    CREATE TRIGGER IF NOT EXISTS {TABLE}_insert AFTER INSERT ON posts_post
+    BEGIN
+        INSERT INTO {TABLE}(rowid, text) VALUES (new.id, new.text);
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS {TABLE}_delete AFTER DELETE ON posts_post
+    BEGIN
+        INSERT INTO {TABLE}({TABLE}, rowid, text)
+        VALUES ('delete', old.id, old.text);
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS {TABLE}_update
+    AFTER UPDATE OF text ON posts_post
+    BEGIN
+        INSERT INTO {TABLE}({TABLE}, rowid, text)
+        VALUES ('delete', old.id, old.text);
+        INSERT INTO {TABLE}(rowid, text) VALUES (new.id, new.text);
+    END
+    ''',
+)
+
+WORD = re.compile(r'\w+')
+
+MATCHES = f'''
+    SELECT rowid AS id, rank AS score FROM {TABLE} WHERE {TABLE} MATCH %s
+'''
+
+
+def is_supported(using=connection):
+    return using.vendor == 'sqlite'
+
+
+def install_triggers(using=connection):
+    if not is_supported(using):
+        return
+    if TABLE not in using.introspection.table_names():
+        return
+    with using.cursor() as cursor:
+        for trigger in TRIGGERS:
+            cursor.execute(trigger)
+
+
+def restore_triggers(using, **kwargs):
+    """``post_migrate`` receiver putting back dropped triggers."""
+
+    install_triggers(connections[using])
+
+
+def rebuild(using=connection):
+    """Repopulate the index from ``posts_post``."""
+
+    with using.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {TABLE}({TABLE}) VALUES ('rebuild')")
+
+
+def match_expression(text):
+    """Turn user input into an FTS5 query of all its words.
+
+    Words are quoted so that FTS5 operators in the input are searched as
+    plain text, and the last word matches as a prefix while it is typed.
+    """
+
+    words = WORD.findall(text)
+    if not words:
+        return None
+    return ' '.join(f'"{word}"' for word in words) + '*'
+
+
+def filter_matching(queryset, text):
+    """Narrow a ``Post`` queryset to posts matching ``text``."""
+
+    expression = match_expression(text)
+    if expression is None:
+        return queryset.none()
+    return queryset.filter(pk__in=RawSQL(
+        f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s', [expression]))
+
+
+class SearchPaginator(CursorPaginator):
+    """Cursor paginator over posts matching ``query``, best first.
+
+    ``object_list`` is the queryset posts are loaded from. Each loaded
+    post carries its bm25 score as ``search_rank``.
+    """
+
+    def __init__(self, object_list, per_page, query, **kwargs):
+        kwargs.setdefault('generations', (FEED,))
+        super().__init__(object_list, per_page, keys=('search_rank', 'pk'),
+                         **kwargs)
+        self.expression = match_expression(query)
+
+    def dump_key(self, value):
+        return value
+
+    def load_key(self, raw):
+        return raw if isinstance(raw, float) else None
+
+    def count_key(self):
+        return f'search:{self.expression}'
+
+    def compute_total(self):
+        if self.expression is None:
+            return 0
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT COUNT(*) FROM {TABLE} WHERE {TABLE} MATCH %s',
+                [self.expression],
+            )
+            return cursor.fetchone()[0]
+
+    def fetch(self, position=None, reverse=False, offset=0, limit=None):
+        if self.expression is None:
+            return []
+        # bm25 is negative: the lower the score, the better the match.
+        sql = f'SELECT id, score FROM ({MATCHES})'
+        params = [self.expression]
+        lookup, order = ('<', 'DESC') if reverse else ('>', 'ASC')
+        if position is not None:
+            score, pk = position
+            sql += (f' WHERE score {lookup} %s'
+                    f' OR (score = %s AND id {lookup} %s)')
+            params += [score, score, pk]
+        sql += f' ORDER BY score {order}, id {order} LIMIT %s OFFSET %s'
+        params += [limit, offset]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            scores = dict(cursor.fetchall())
+        posts = self.object_list.in_bulk(list(scores))
+        rows = []
+        for pk, score in scores.items():
+            if pk in posts:
+                posts[pk].search_rank = score
+                rows.append(posts[pk])
+        return rows
@@ -0,0 +1,96 @@
+from django.db.models.signals import (post_delete, post_init, post_save,
+                                      pre_save)
+from django.dispatch import receiver
+
+from . import counters, media, timeline
+from .invalidation import post_being_deleted, user_being_deleted
+from .models import Comment, Follow, Post
+
+
+@receiver(post_save, sender=Post)
+def post_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.change_user_counters(instance.author_id, posts_count=1)
+        timeline.fan_out(instance)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    if not user_being_deleted(instance.author_id):
+        counters.change_user_counters(instance.author_id, posts_count=-1)
+    media.release(instance.image.name)
+
+
+def image_name(instance):
+    """Return the loaded image name of a post, None if it is deferred."""
+
+    if 'image' not in instance.__dict__:
+        return None
+    value = instance.__dict__['image']
+    return getattr(value, 'name', value) or ''
+
+
+@receiver(post_init, sender=Post)
+def remember_image(sender, instance, **kwargs):
+    instance._initial_image = image_name(instance)
+
+
+@receiver(pre_save, sender=Post)
+def image_changed(sender, instance, raw=False, **kwargs):
+    # Variants and size of the old image must not be shown for the new one.
+    name = image_name(instance)
+    if raw or name is None:
+        return
+    if not instance._state.adding and name == instance._initial_image:
+        return
+    instance.image_variants = ''
+    media.describe(instance)
+
+
+@receiver(post_save, sender=Post)
+def count_image_references(sender, instance, created, raw=False,
+                           update_fields=None, **kwargs):
+    if raw or (update_fields is not None and 'image' not in update_fields):
+        return
+    name = image_name(instance)
+    initial = '' if created else instance._initial_image
+    if name is None or initial is None or name == initial:
+        return
+    media.add_reference(name)
+    media.release(initial)
+    instance._initial_image = name
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        # Also moves the post's updated_at, the cache validator of its page.
+        counters.change_comments_count(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    if not post_being_deleted(instance.post_id):
+        counters.change_comments_count(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.change_user_counters(instance.author_id, followers_count=1)
+        counters.change_user_counters(instance.user_id, following_count=1)
+        timeline.switch_modes([instance.author_id])
+        timeline.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    # The counters and timeline of a deleted user go with the user.
+    if not user_being_deleted(instance.author_id):
+        counters.change_user_counters(
+            instance.author_id, followers_count=-1)
+        timeline.switch_modes([instance.author_id])
+    if not user_being_deleted(instance.user_id):
+        counters.change_user_counters(
+            instance.user_id, following_count=-1)
+        timeline.prune(instance.user_id, instance.author_id)
@@ -0,0 +1,43 @@
+"""Content-addressed storage for post images.
+
+Files are saved under the SHA-256 of their content, so an image uploaded
+many times (reposts, memes) is stored once and, since sorl thumbnails and
+responsive variants are keyed by the source name, thumbnailed once too.
+``posts.media`` counts the posts referencing each file and deletes it
+with its thumbnails when the last one goes.
+"""
+import hashlib
+import os
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Store ``<dir>/<aa>/<sha256>.<ext>`` and skip files already there."""
+
+    digest_length = 32
+
+    def hashed_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        hexdigest = digest.hexdigest()[:self.digest_length]
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        return os.path.join(directory, hexdigest[:2], hexdigest + extension)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            return name
+        # Two identical uploads at once may still race to create the file;
+        # the loser gets a suffixed copy from get_available_name().
+        return super().save(name, content, max_length)
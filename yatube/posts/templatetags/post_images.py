@@ -0,0 +1,69 @@
+from django import template
+from django.conf import settings
+
+from posts import thumbnails, variants
+
+register = template.Library()
+
+
+@register.simple_tag
+def prefetch_thumbnails(posts, name):
+    """Look up the ``name`` thumbnails of all ``posts`` at once.
+
+    The results are kept on each post for ``post_thumbnail``, so a feed
+    page costs one key-value lookup instead of one per card.
+    """
+
+    posts = [post for post in posts if post.image]
+    found = thumbnails.lookup_many([post.image for post in posts], name)
+    for post in posts:
+        if not hasattr(post, 'thumbnails'):
+            post.thumbnails = {}
+        post.thumbnails[name] = found.get(post.image.name)
+    return ''
+
+
+@register.simple_tag
+def post_thumbnail(post, name):
+    """Return the ``name`` thumbnail of the post image if it is ready.
+
+    A missing thumbnail is queued for generation and None is returned,
+    so the template shows a placeholder instead of making it inline.
+    """
+
+    image = post.image
+    if not image:
+        return None
+    prefetched = getattr(post, 'thumbnails', {})
+    if name in prefetched:
+        thumbnail = prefetched[name]
+    else:
+        thumbnail = thumbnails.lookup(image, name)
+    if thumbnail is None:
+        thumbnails.enqueue(image)
+        if not settings.THUMBNAIL_ASYNC:
+            thumbnail = thumbnails.lookup(image, name)
+    return thumbnail
+
+
+@register.simple_tag
+def post_variants(post):
+    """Return the responsive variants of the post image or None.
+
+    Images without variants yet are queued like missing thumbnails.
+    """
+
+    if not post.image:
+        return None
+    found = variants.sources(post)
+    if found is None:
+        thumbnails.enqueue(post.image)
+    return found
+
+
+@register.simple_tag
+def card_size(post):
+    """Return ``{'width': ..., 'height': ...}`` of the post image card."""
+
+    width, height = variants.card_size(post)
+    return {'width': width, 'height': height}
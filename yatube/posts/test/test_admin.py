@@ -0,0 +1,127 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..admin import PostAdmin
+from ..generations import get_version, group_generation
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class AdminChangelistTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        cls.authors = [
+            User.objects.create_user(username=f'author_{i}')
+            for i in range(3)
+        ]
+        for i in range(12):
+            post = Post.objects.create(
+                text=f'Пост номер {i}',
+                author=cls.authors[i % 3],
+                group=cls.group if i % 2 else None,
+            )
+            Comment.objects.create(
+                post=post, author=cls.authors[0], text='Комментарий')
+        Follow.objects.create(user=cls.authors[0], author=cls.authors[1])
+
+    def setUp(self) -> None:
+        super().setUp()
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def changelist(self, model, params=None):
+        url = reverse(f'admin:posts_{model}_changelist')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params or {})
+        self.assertEqual(response.status_code, 200)
+        return response, [query['sql'] for query in queries]
+
+    def test_changelists_do_not_query_per_row(self):
+        """Число запросов списка не зависит от числа строк."""
+
+        for model in ('post', 'comment', 'follow'):
+            with self.subTest(model=model):
+                _, few = self.changelist(model, {'q': 'author_1'}
+                                         if model != 'post' else {'q': '1'})
+                _, many = self.changelist(model)
+                self.assertEqual(len(few), len(many))
+
+    def test_counts_are_cached(self):
+        """Полный и повторный подсчёт строк не выполняется."""
+
+        def counts(queries):
+            return [sql for sql in queries
+                    if 'COUNT(' in sql and 'FROM "posts_post"' in sql]
+
+        _, queries = self.changelist('post')
+        self.assertEqual(len(counts(queries)), 1)
+        _, queries = self.changelist('post')
+        self.assertFalse(counts(queries))
+
+    def test_post_search_uses_full_text_index(self):
+        """Поиск постов идёт по индексу FTS5, а не через LIKE."""
+
+        response, queries = self.changelist('post', {'q': 'номер 11'})
+        self.assertEqual(
+            [post.text for post in response.context['cl'].result_list],
+            ['Пост номер 11'],
+        )
+        self.assertTrue([sql for sql in queries if 'posts_post_fts' in sql])
+        self.assertFalse([sql for sql in queries if 'LIKE' in sql])
+
+    def test_username_lookups(self):
+        """Комментарии и подписки ищутся по имени пользователя."""
+
+        response, _ = self.changelist('comment', {'q': 'author_0'})
+        self.assertEqual(len(response.context['cl'].result_list), 12)
+        response, _ = self.changelist('follow', {'q': 'author_1'})
+        self.assertEqual(len(response.context['cl'].result_list), 1)
+
+    def test_forms_still_work(self):
+        """Правка поста из списка и формы изменения работает."""
+
+        post = Post.objects.first()
+        response = self.client.get(
+            reverse('admin:posts_post_change', args=[post.pk]))
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(
+            reverse('admin:posts_comment_change',
+                    args=[Comment.objects.first().pk]))
+        self.assertEqual(response.status_code, 200)
+
+    def test_projected_rows_refresh_validators(self):
+        """Сохранение строки списка обновляет updated_at и старую группу."""
+
+        post = Post.objects.filter(group=self.group).first()
+        before = post.updated_at
+        projected = Post.objects.only(*PostAdmin.list_only).get(pk=post.pk)
+        projected.group = None
+        old_group = get_version(group_generation(self.group.slug))
+        projected.save()
+        post.refresh_from_db()
+        self.assertIsNone(post.group_id)
+        self.assertGreater(post.updated_at, before)
+        self.assertNotEqual(
+            get_version(group_generation(self.group.slug)), old_group)
+
+    def test_deferred_group_is_read_on_save(self):
+        """Группа, не загруженная из базы, читается перед сохранением."""
+
+        post = Post.objects.filter(group=self.group).first()
+        deferred = Post.objects.only('text').get(pk=post.pk)
+        deferred.group = None
+        old_group = get_version(group_generation(self.group.slug))
+        deferred.save()
+        self.assertNotEqual(
+            get_version(group_generation(self.group.slug)), old_group)
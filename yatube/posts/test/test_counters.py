@@ -0,0 +1,97 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Comment, Follow, Post, UserCounter
+
+User = get_user_model()
+
+
+class CountersTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def counters(self, user):
+        return UserCounter.objects.get(user=user)
+
+    def test_post_and_comment_counters(self):
+        """Счётчики постов и комментариев меняются при записи."""
+
+        self.author_client.post(
+            reverse('posts:post_create'), {'text': 'Новый пост'})
+        post = Post.objects.get(text='Новый пост')
+        self.assertEqual(self.counters(self.author).posts_count, 1)
+
+        self.reader_client.post(
+            reverse('posts:add_comment', args=[post.pk]),
+            {'text': 'Комментарий'}
+        )
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+
+        self.author_client.get(reverse('posts:post_remove', args=[post.pk]))
+        self.assertEqual(self.counters(self.author).posts_count, 0)
+
+    def test_follow_counters(self):
+        """Счётчики подписчиков и подписок меняются при подписке."""
+
+        url = reverse('posts:profile_follow', args=[self.author.username])
+        self.reader_client.get(url)
+        self.assertEqual(self.counters(self.author).followers_count, 1)
+        self.assertEqual(self.counters(self.reader).following_count, 1)
+
+        url = reverse('posts:profile_unfollow', args=[self.author.username])
+        self.reader_client.get(url)
+        self.assertEqual(self.counters(self.author).followers_count, 0)
+        self.assertEqual(self.counters(self.reader).following_count, 0)
+
+    def test_recount_repairs_drift(self):
+        """Команда recount исправляет расхождения счётчиков."""
+
+        post = Post.objects.create(text='Пост', author=self.author)
+        Post.objects.bulk_create([Post(text='Тихий', author=self.author)])
+        post.comments.create(author=self.reader, text='Комментарий')
+        Post.objects.filter(pk=post.pk).update(comments_count=5)
+
+        out = StringIO()
+        call_command('recount', '--batch-size', '1', stdout=out)
+
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(self.counters(self.author).posts_count, 2)
+        self.assertIn('fixed 1', out.getvalue())
+
+    def test_user_deletion(self):
+        """Удаление пользователя с подписками, постами и комментариями."""
+
+        author = User.objects.create_user(username='leaving')
+        Follow.objects.create(user=author, author=self.reader)
+        Follow.objects.create(user=self.reader, author=author)
+        Follow.objects.create(user=self.author, author=author)
+        own = Post.objects.create(text='Свой пост', author=author)
+        other = Post.objects.create(text='Чужой пост', author=self.reader)
+        Comment.objects.create(post=own, author=self.reader, text='Им')
+        Comment.objects.create(post=other, author=author, text='Его')
+        self.counters(author)
+        author.delete()
+        self.assertFalse(UserCounter.objects.filter(user_id=author.pk))
+        reader = self.counters(self.reader)
+        self.assertEqual(reader.followers_count, 0)
+        self.assertEqual(reader.following_count, 0)
+        self.assertEqual(self.counters(self.author).following_count, 0)
+        other.refresh_from_db()
+        self.assertEqual(other.comments_count, 0)
@@ -0,0 +1,89 @@
+import gzip
+import json
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ExportPostsTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        cls.posts = [
+            Post.objects.create(
+                text=f'Пост {i}',
+                author=cls.author if i % 2 else cls.reader,
+                group=cls.group if i % 2 else None,
+            )
+            for i in range(4)
+        ]
+        Comment.objects.create(
+            post=cls.posts[1], author=cls.reader, text='Комментарий')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def export(self, *args):
+        out, err = StringIO(), StringIO()
+        call_command('export_posts', *args, stdout=out, stderr=err)
+        return [json.loads(line) for line in out.getvalue().splitlines()]
+
+    def test_exports_all_models(self):
+        """Все модели выгружаются построчно с полной точностью дат."""
+
+        records = self.export('--chunk-size', '2')
+        self.assertEqual(
+            [record['model'] for record in records],
+            ['group'] + ['post'] * 4 + ['comment', 'follow'],
+        )
+        post = records[2]
+        self.assertEqual(post['text'], 'Пост 1')
+        self.assertEqual(post['author'], 'author')
+        self.assertEqual(post['group'], 'group')
+        self.assertEqual(
+            post['pub_date'], self.posts[1].pub_date.isoformat())
+        self.assertEqual(records[-2]['post'], self.posts[1].pk)
+        self.assertEqual(records[-1]['user'], 'reader')
+
+    def test_filters(self):
+        """Фильтры по автору, группе и датам."""
+
+        records = self.export('--models', 'post', '--author', 'reader')
+        self.assertEqual(
+            [record['text'] for record in records], ['Пост 0', 'Пост 2'])
+
+        records = self.export('--models', 'post', 'comment',
+                              '--group', 'group')
+        self.assertEqual(
+            [record['model'] for record in records],
+            ['post', 'post', 'comment'],
+        )
+
+        future = (timezone.now() + timedelta(days=1)).isoformat()
+        self.assertEqual(self.export('--models', 'post', '--since', future),
+                         [])
+        self.assertEqual(
+            len(self.export('--models', 'post', '--until', future)), 4)
+
+    def test_gzip_file(self):
+        """Выгрузка в файл .gz сжимается."""
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'dump.ndjson.gz')
+            call_command('export_posts', '--output', path, stderr=StringIO())
+            with gzip.open(path, 'rt', encoding='utf-8') as dump:
+                lines = dump.read().splitlines()
+        self.assertEqual(len(lines), 7)
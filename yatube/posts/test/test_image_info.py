@@ -0,0 +1,83 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import Client
+from django.urls import reverse
+from posts.generations import FEED, get_generation
+from posts.management.commands import backfill_image_info
+from posts.models import Post
+from posts.uploads import describe_file
+
+from .utils import MediaTestCase, jpeg
+
+
+class ImageInfoTest(MediaTestCase):
+
+    def test_upload_stores_size_and_placeholder(self):
+        """При загрузке сохраняются размеры и размытая заглушка"""
+
+        client = Client()
+        client.force_login(self.user)
+        client.post(
+            reverse('posts:post_create'),
+            {'text': 'Фото', 'image': jpeg(1200, 600)},
+        )
+        post = Post.objects.get(text='Фото')
+        self.assertEqual((post.image_width, post.image_height), (1200, 600))
+        self.assertTrue(
+            post.image_placeholder.startswith('data:image/jpeg;base64,'))
+
+    def test_cards_reserve_space(self):
+        """Карточки ленты резервируют место и грузят картинку лениво"""
+
+        post = Post.objects.create(
+            text='Фото', author=self.user, image=jpeg(500, 300))
+        response = Client().get(reverse('posts:index'))
+        self.assertContains(response, 'width="320" height="113"')
+        self.assertContains(response, 'loading="lazy"')
+        self.assertContains(response, f"url('{post.image_placeholder}')")
+        detail = Client().get(reverse('posts:post_detail', args=[post.pk]))
+        self.assertNotContains(detail, 'loading="lazy"')
+
+    def test_backfill_describes_old_posts(self):
+        """Команда заполняет размеры у постов, загруженных раньше"""
+
+        first = Post.objects.create(
+            text='Фото', author=self.user, image=jpeg(800, 400))
+        second = Post.objects.create(
+            text='Репост', author=self.user, image=jpeg(800, 400))
+        broken = Post.objects.create(
+            text='Пропавшее', author=self.user, image='posts/missing.jpg')
+        Post.objects.update(
+            image_width=None, image_height=None, image_placeholder='')
+        feed = get_generation(FEED)
+        stdout, stderr = StringIO(), StringIO()
+        call_command('backfill_image_info', '--batch-size', '1',
+                     stdout=stdout, stderr=stderr)
+        for post in (first, second):
+            post.refresh_from_db()
+            self.assertEqual(
+                (post.image_width, post.image_height), (800, 400))
+            self.assertTrue(post.image_placeholder)
+        broken.refresh_from_db()
+        self.assertIsNone(broken.image_width)
+        self.assertIn('Updated posts: 2, failed: 1', stdout.getvalue())
+        self.assertIn('posts/missing.jpg', stderr.getvalue())
+        self.assertNotEqual(get_generation(FEED), feed)
+
+    def test_backfill_describes_shared_image_once_per_batch(self):
+        """Общая картинка описывается один раз на пачку постов"""
+
+        for text in ('Фото', 'Репост', 'Ещё репост'):
+            Post.objects.create(
+                text=text, author=self.user, image=jpeg(600, 300))
+        Post.objects.update(image_width=None)
+        stdout, stderr = StringIO(), StringIO()
+        with mock.patch.object(
+                backfill_image_info, 'describe_file',
+                wraps=describe_file) as describe:
+            call_command('backfill_image_info', stdout=stdout, stderr=stderr)
+        describe.assert_called_once()
+        self.assertIn('Updated posts: 3, failed: 0', stdout.getvalue())
+        self.assertIn('Described 1 images', stderr.getvalue())
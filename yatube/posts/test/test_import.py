@@ -0,0 +1,117 @@
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+
+from ..management.commands.import_posts import Command
+from ..models import Comment, FeedEntry, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ImportPostsTest(TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        cache.clear()
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def call(self, *args):
+        call_command(
+            'import_posts', *args, '--batch-size', '2',
+            stdout=StringIO(), stderr=StringIO())
+
+    def test_round_trip_rebuilds_derived_data(self):
+        """Выгрузка загружается обратно со счётчиками и лентами."""
+
+        author = User.objects.create_user(username='author')
+        reader = User.objects.create_user(username='reader')
+        group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        posts = [
+            Post.objects.create(text=f'Пост {i}', author=author, group=group)
+            for i in range(3)
+        ]
+        Comment.objects.create(post=posts[0], author=reader, text='Ответ')
+        Follow.objects.create(user=reader, author=author)
+        dates = [post.pub_date for post in posts]
+        dump = self.path('dump.ndjson.gz')
+        call_command('export_posts', '--output', dump, stderr=StringIO())
+
+        Post.objects.all().delete()
+        Follow.objects.all().delete()
+        group.delete()
+        author.delete()
+
+        self.call(dump)
+
+        imported = list(Post.objects.order_by('pub_date'))
+        self.assertEqual(
+            [post.text for post in imported], ['Пост 0', 'Пост 1', 'Пост 2'])
+        self.assertEqual([post.pub_date for post in imported], dates)
+        new_author = User.objects.get(username='author')
+        self.assertFalse(new_author.has_usable_password())
+        self.assertEqual(imported[0].group.title, 'Группа')
+        self.assertEqual(imported[0].comments_count, 1)
+        self.assertEqual(new_author.counters.posts_count, 3)
+        self.assertEqual(new_author.counters.followers_count, 1)
+        self.assertEqual(
+            FeedEntry.objects.filter(user=reader).count(), 3)
+
+    def test_csv_posts(self):
+        """Посты из CSV с новыми авторами и группами."""
+
+        with open(self.path('posts.csv'), 'w', encoding='utf-8') as source:
+            source.write(
+                'text,author,group,pub_date\n'
+                'Первый,legacy,old-group,2015-01-01T10:00:00\n'
+                'Второй,legacy,,\n'
+                ',legacy,,\n'
+            )
+        self.call(self.path('posts.csv'))
+
+        posts = Post.objects.filter(author__username='legacy')
+        self.assertEqual(posts.count(), 2)
+        first = posts.get(text='Первый')
+        self.assertEqual(first.pub_date.year, 2015)
+        self.assertEqual(first.group.slug, 'old-group')
+        self.assertIsNone(posts.get(text='Второй').group)
+
+    def test_posts_written_during_import_do_not_collide(self):
+        """Посты, созданные на сайте во время загрузки, не мешают ей."""
+
+        site_user = User.objects.create_user(username='site')
+        original = Command.import_follows
+
+        def import_follows(command, records):
+            original(command, records)
+            Post.objects.create(text='С сайта', author=site_user)
+
+        with open(self.path('posts.csv'), 'w', encoding='utf-8') as source:
+            source.write('text,author\n' + 'Пост,legacy\n' * 5)
+        with mock.patch.object(Command, 'import_follows', import_follows):
+            self.call(self.path('posts.csv'))
+        self.assertEqual(
+            Post.objects.filter(author__username='legacy').count(), 5)
+
+    def test_orphan_comments_are_reported(self):
+        """Комментарии к постам не из выгрузки не теряются молча."""
+
+        with open(self.path('dump.ndjson'), 'w', encoding='utf-8') as dump:
+            dump.write(
+                '{"model": "comment", "post": 42, "author": "reader", '
+                '"text": "Ответ"}\n')
+        stderr = StringIO()
+        call_command('import_posts', self.path('dump.ndjson'),
+                     stdout=StringIO(), stderr=stderr)
+        self.assertFalse(Comment.objects.exists())
+        self.assertIn('Skipped 1 comments', stderr.getvalue())
@@ -0,0 +1,187 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..generations import (FEED, author_generation, follower_generation,
+                           get_version, group_generation, post_generation)
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class InvalidationTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group_1 = Group.objects.create(
+            title='Группа 1', slug='group1', description='Описание')
+        cls.group_2 = Group.objects.create(
+            title='Группа 2', slug='group2', description='Описание')
+
+    def setUp(self) -> None:
+        super().setUp()
+        cache.clear()
+
+    def assertBumped(self, names, action):
+        before = {name: get_version(name) for name in names}
+        action()
+        for name in names:
+            with self.subTest(name=name):
+                self.assertNotEqual(get_version(name), before[name])
+
+    def assertNotBumped(self, names, action):
+        before = {name: get_version(name) for name in names}
+        action()
+        for name in names:
+            with self.subTest(name=name):
+                self.assertEqual(get_version(name), before[name])
+
+    def test_post_writes(self):
+        """Запись поста обновляет ленту, автора, группу и сам пост."""
+
+        post = Post.objects.create(
+            text='Пост', author=self.author, group=self.group_1)
+        names = [
+            FEED,
+            author_generation(self.author.pk),
+            group_generation(self.group_1.slug),
+            post_generation(post.pk),
+        ]
+        self.assertBumped(names, post.save)
+        self.assertNotBumped(
+            [group_generation(self.group_2.slug)], post.save)
+
+        def move():
+            post.group = self.group_2
+            post.save()
+
+        self.assertBumped(
+            [group_generation('group1'), group_generation('group2')], move)
+        names[2] = group_generation(self.group_2.slug)
+        self.assertBumped(names, post.delete)
+
+    def test_comment_writes(self):
+        """Комментарий обновляет пост и ленты с его карточкой."""
+
+        post = Post.objects.create(
+            text='Пост', author=self.author, group=self.group_1)
+        self.assertBumped(
+            [FEED, post_generation(post.pk),
+             group_generation(self.group_1.slug)],
+            lambda: Comment.objects.create(
+                post=post, author=self.reader, text='Комментарий'),
+        )
+
+    def test_post_delete_cost_does_not_grow_with_comments(self):
+        """Удаление поста не тратит запросы на каждый комментарий."""
+
+        def delete_with(comments):
+            post = Post.objects.create(
+                text='Пост', author=self.author, group=self.group_1)
+            for _ in range(comments):
+                Comment.objects.create(
+                    post=post, author=self.reader, text='Ответ')
+            with CaptureQueriesContext(connection) as queries:
+                post.delete()
+            return len(queries)
+
+        self.assertEqual(delete_with(5), delete_with(1))
+
+    def test_group_rename(self):
+        """Смена slug обновляет и старый, и новый адрес группы."""
+
+        def rename():
+            group = Group.objects.get(slug='group1')
+            group.slug = 'renamed'
+            group.save()
+
+        self.assertBumped(
+            [FEED, group_generation('group1'), group_generation('renamed')],
+            rename,
+        )
+
+    def test_follow_writes(self):
+        """Подписка обновляет ленту подписчика и профиль автора."""
+
+        names = [
+            follower_generation(self.reader.pk),
+            author_generation(self.author.pk),
+        ]
+        self.assertBumped(
+            names,
+            lambda: Follow.objects.create(
+                user=self.reader, author=self.author),
+        )
+        self.assertBumped(
+            names, lambda: Follow.objects.filter(user=self.reader).delete())
+
+
+class AnonymousPageCacheTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        cls.post = Post.objects.create(
+            text='Пост', author=cls.author, group=cls.group)
+
+    def setUp(self) -> None:
+        super().setUp()
+        cache.clear()
+
+    def get(self, url, client=None):
+        return (client or self.client).get(url).get('X-Page-Cache')
+
+    def test_pages_are_cached(self):
+        """Страницы для гостя отдаются из кеша до изменения данных."""
+
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', args=[self.group.slug]),
+            reverse('posts:profile', args=[self.author.username]),
+            reverse('posts:post_detail', args=[self.post.pk]),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.get(url), 'MISS')
+                with self.assertNumQueries(0):
+                    self.assertEqual(self.get(url), 'HIT')
+
+        Comment.objects.create(
+            post=self.post, author=self.author, text='Комментарий')
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.get(url), 'MISS')
+
+    def test_purge_is_per_entity(self):
+        """Запись сбрасывает только страницы со своими сущностями."""
+
+        other = User.objects.create_user(username='other')
+        Post.objects.create(text='Чужой пост', author=other)
+        group_url = reverse('posts:group_list', args=[self.group.slug])
+        profile_url = reverse('posts:profile', args=[other.username])
+        self.get(group_url)
+        self.get(profile_url)
+
+        Post.objects.create(text='Пост в группе', author=self.author,
+                            group=self.group)
+        self.assertEqual(self.get(group_url), 'MISS')
+        self.assertEqual(self.get(profile_url), 'HIT')
+
+    def test_logged_in_users_bypass(self):
+        """Авторизованные пользователи не получают и не наполняют кеш."""
+
+        client = Client()
+        client.force_login(self.author)
+        url = reverse('posts:index')
+        self.assertIsNone(self.get(url, client))
+        self.assertEqual(self.get(url), 'MISS')
+        self.assertIsNone(self.get(url, client))
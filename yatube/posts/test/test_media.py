@@ -0,0 +1,137 @@
+import hashlib
+import json
+from unittest import mock
+
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from posts import media, thumbnails, variants
+from posts.models import Post, StoredImage, StoredVariant, post_image_storage
+
+from .utils import MediaTestCase, png, run_on_commit
+
+
+class ContentAddressedStorageTest(MediaTestCase):
+
+    def references(self, name):
+        return StoredImage.objects \
+            .filter(name=name) \
+            .values_list('references', flat=True) \
+            .first()
+
+    def test_file_is_named_by_content(self):
+        """Файл называется по хешу содержимого"""
+
+        image = png('red')
+        digest = hashlib.sha256(image.file.getvalue()).hexdigest()[:32]
+        post = Post.objects.create(text='Мем', author=self.user, image=image)
+        self.assertEqual(post.image.name, f'posts/{digest[:2]}/{digest}.png')
+
+    def test_same_content_is_stored_once(self):
+        """Одинаковые картинки хранятся одним файлом со счётчиком ссылок"""
+
+        first = Post.objects.create(
+            text='Мем', author=self.user, image=png('green', 'a.png'))
+        second = Post.objects.create(
+            text='Репост', author=self.user, image=png('green', 'b.png'))
+        other = Post.objects.create(
+            text='Другой', author=self.user, image=png('blue'))
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertNotEqual(first.image.name, other.image.name)
+        self.assertEqual(self.references(first.image.name), 2)
+        self.assertEqual(self.references(other.image.name), 1)
+
+    def test_file_is_deleted_with_last_reference(self):
+        """Файл удаляется вместе с последним использующим его постом"""
+
+        posts = [
+            Post.objects.create(
+                text='Мем', author=self.user, image=png('yellow'))
+            for _ in range(2)
+        ]
+        name = posts[0].image.name
+        with run_on_commit():
+            posts[0].delete()
+            self.assertTrue(post_image_storage.exists(name))
+            posts[1].delete()
+        self.assertFalse(post_image_storage.exists(name))
+        self.assertIsNone(self.references(name))
+
+    def test_edit_moves_reference(self):
+        """Замена картинки переносит ссылку на новый файл"""
+
+        post = Post.objects.create(
+            text='Мем', author=self.user, image=png('white'))
+        old_name = post.image.name
+        client = Client()
+        client.force_login(self.user)
+        with run_on_commit(), mock.patch.object(thumbnails, '_submit'):
+            client.post(
+                reverse('posts:post_edit', args=[post.pk]),
+                {'text': 'Мем', 'image': png('black')},
+            )
+        post.refresh_from_db()
+        self.assertNotEqual(post.image.name, old_name)
+        self.assertEqual(self.references(post.image.name), 1)
+        self.assertIsNone(self.references(old_name))
+        self.assertFalse(post_image_storage.exists(old_name))
+
+    def test_thumbnails_are_reused(self):
+        """Миниатюра одинаковой картинки создаётся один раз"""
+
+        first = Post.objects.create(
+            text='Мем', author=self.user, image=png('purple'))
+        thumbnails.generate(first.image.name)
+        second = Post.objects.create(
+            text='Репост', author=self.user, image=png('purple'))
+        self.assertIsNotNone(thumbnails.lookup(second.image, 'card'))
+
+    def test_recount_repairs_references(self):
+        """Пересчёт исправляет разошедшиеся счётчики ссылок"""
+
+        post = Post.objects.create(
+            text='Мем', author=self.user, image=png('orange'))
+        StoredImage.objects.filter(name=post.image.name).update(references=7)
+        StoredImage.objects.create(name='posts/lost.png', references=1)
+        self.assertEqual(media.recount_images(), 2)
+        self.assertEqual(self.references(post.image.name), 1)
+        self.assertIsNone(self.references('posts/lost.png'))
+
+    def test_variants_are_deleted_with_last_reference(self):
+        """Варианты картинки удаляются вместе с последней ссылкой на неё"""
+
+        post = Post.objects.create(
+            text='Мем', author=self.user, image=png('gray'))
+        variants.build(post.image.name)
+        post.refresh_from_db()
+        files = [
+            name for listed in json.loads(post.image_variants).values()
+            for _, name in listed
+        ]
+        self.assertTrue(files)
+        with run_on_commit():
+            post.delete()
+        for name in files:
+            self.assertFalse(default_storage.exists(name))
+
+    def test_shared_variant_files_are_kept(self):
+        """Файл варианта, общий с другой картинкой, не удаляется"""
+
+        post = Post.objects.create(
+            text='Мем', author=self.user, image=png('navy'))
+        variants.build(post.image.name)
+        files = list(
+            StoredVariant.objects
+            .filter(source=post.image.name)
+            .values_list('name', flat=True)
+        )
+        StoredVariant.objects.create(source='posts/other.png', name=files[0])
+        with run_on_commit():
+            with CaptureQueriesContext(connection) as queries:
+                post.delete()
+        self.assertFalse([q for q in queries if 'LIKE' in q['sql']])
+        self.assertTrue(default_storage.exists(files[0]))
+        for name in files[1:]:
+            self.assertFalse(default_storage.exists(name))
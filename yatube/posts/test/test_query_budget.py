@@ -0,0 +1,129 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post
+from .utils import query_budget
+
+User = get_user_model()
+
+
+class QueryBudgetTest(TestCase):
+    """Число запросов страницы не зависит от числа постов на ней."""
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа',
+            slug='group',
+            description='Описание',
+        )
+        cls.authors = [
+            User.objects.create_user(username=f'author_{i}')
+            for i in range(3)
+        ]
+        for author in cls.authors:
+            Follow.objects.create(user=cls.reader, author=author)
+        cls.posts = [
+            Post.objects.create(
+                text=f'Пост {i}',
+                author=cls.authors[i % 3],
+                group=cls.group if i % 2 else None,
+            )
+            for i in range(25)
+        ]
+        for author in cls.authors:
+            Comment.objects.create(
+                post=cls.posts[-1], author=author, text='Комментарий')
+
+    def setUp(self) -> None:
+        super().setUp()
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        self.guest_client = Client()
+
+    def test_feed_budgets(self):
+        budgets = {
+            reverse('posts:index'): 3,
+            reverse('posts:group_list', args=[self.group.slug]): 4,
+            # +1 на поиск автора или поста для ETag.
+            reverse('posts:profile', args=[self.authors[0].username]): 6,
+            reverse('posts:follow_index'): 5,
+            reverse('posts:post_detail', args=[self.posts[-1].pk]): 5,
+        }
+        for url, budget in budgets.items():
+            # Прогреваем кеш размера ленты.
+            self.reader_client.get(url)
+            with self.subTest(url=url):
+                with query_budget(budget):
+                    self.reader_client.get(url)
+                with query_budget(budget - 2):
+                    self.guest_client.get(url)
+
+    def test_next_page_budgets(self):
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', args=[self.group.slug]),
+            reverse('posts:follow_index'),
+        ]
+        for url in urls:
+            page_obj = self.reader_client.get(url).context['page_obj']
+            with self.subTest(url=url):
+                with query_budget(5):
+                    self.reader_client.get(
+                        url, {'cursor': page_obj.next_cursor})
+
+    def test_fragment_budgets(self):
+        budgets = {
+            reverse('posts:index_more'): 3,
+            reverse('posts:group_list_more', args=[self.group.slug]): 4,
+            reverse(
+                'posts:profile_more', args=[self.authors[0].username]): 5,
+            reverse('posts:follow_index_more'): 4,
+            reverse('posts:post_comments', args=[self.posts[-1].pk]): 1,
+        }
+        for url, budget in budgets.items():
+            self.reader_client.get(url)
+            with self.subTest(url=url):
+                with query_budget(budget):
+                    self.reader_client.get(url)
+
+    def test_search_budget(self):
+        url = reverse('posts:search')
+        self.reader_client.get(url, {'q': 'Пост'})
+        with query_budget(4):
+            self.reader_client.get(url, {'q': 'Пост'})
+        with query_budget(2):
+            self.guest_client.get(url, {'q': 'Пост'})
+
+    def test_api_budgets(self):
+        post = self.posts[-1]
+        urls = [
+            reverse('api:posts'),
+            reverse('api:post', args=[post.pk]),
+            reverse('api:comments', args=[post.pk]),
+            reverse('api:groups'),
+            reverse('api:follows') + f'?user={self.reader.username}',
+            reverse('api:profile', args=[self.authors[0].username]),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                with query_budget(1):
+                    response = self.guest_client.get(url)
+                    # Списки читаются из базы по мере отдачи ответа.
+                    if response.streaming:
+                        b''.join(response.streaming_content)
+
+    def test_post_edit_budget(self):
+        self.client.force_login(self.authors[0])
+        with query_budget(4):
+            self.client.get(
+                reverse('posts:post_edit', args=[self.posts[0].pk]))
+
+    @query_budget(3)
+    def test_post_create_budget(self):
+        self.reader_client.get(reverse('posts:post_create'))
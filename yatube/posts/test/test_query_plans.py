@@ -0,0 +1,77 @@
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post
+from ..timeline import switch_modes
+
+User = get_user_model()
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN is SQLite')
+class QueryPlanTest(TestCase):
+    """Каждый запрос страниц должен идти по индексу без сортировки."""
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа',
+            slug='group',
+            description='Описание',
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.posts = [
+            Post.objects.create(
+                text=f'Пост {i}', author=cls.author, group=cls.group)
+            for i in range(15)
+        ]
+        Comment.objects.create(
+            post=cls.posts[0], author=cls.reader, text='Комментарий')
+        cls.reader_client = Client()
+        cls.reader_client.force_login(cls.reader)
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assert_plans_use_indexes(self, url, data=None):
+        with CaptureQueriesContext(connection) as queries:
+            self.reader_client.get(url, data)
+        selects = [q['sql'] for q in queries if q['sql'].startswith('SELECT')]
+        self.assertTrue(selects)
+        for sql in selects:
+            for step in self.explain(sql):
+                with self.subTest(url=url, sql=sql, step=step):
+                    self.assertNotIn('TEMP B-TREE', step)
+                    if step.startswith('SCAN'):
+                        self.assertIn('USING', step)
+
+    def test_feed_plans(self):
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', args=[self.group.slug]),
+            reverse('posts:profile', args=[self.author.username]),
+            reverse('posts:follow_index'),
+        ]
+        for url in urls:
+            self.assert_plans_use_indexes(url)
+            page_obj = self.reader_client.get(url).context['page_obj']
+            cursor = page_obj.next_cursor
+            self.assert_plans_use_indexes(url, {'cursor': cursor})
+
+    def test_post_detail_plans(self):
+        self.assert_plans_use_indexes(
+            reverse('posts:post_detail', args=[self.posts[0].pk]))
+
+    @override_settings(FEED_PULL_THRESHOLD=0)
+    def test_pulled_feed_plans(self):
+        switch_modes([self.author.pk])
+        self.assert_plans_use_indexes(reverse('posts:follow_index'))
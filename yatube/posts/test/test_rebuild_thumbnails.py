@@ -0,0 +1,69 @@
+import json
+import os
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.test import override_settings
+from posts import thumbnails
+from posts.models import Post
+
+from .utils import MediaTestCase, jpeg
+
+
+@override_settings(IMAGE_VARIANT_FORMATS=('jpeg',))
+class RebuildThumbnailsTest(MediaTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.checkpoint = os.path.join(self.media_root, 'checkpoint.json')
+
+    def rebuild(self, *args):
+        stdout, stderr = StringIO(), StringIO()
+        call_command('rebuild_thumbnails', '--workers', '2',
+                     '--batch-size', '2', *args,
+                     stdout=stdout, stderr=stderr)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_every_image_is_rendered_once(self):
+        """Каждая картинка обрабатывается один раз, даже у нескольких постов"""
+
+        posts = [
+            Post.objects.create(
+                text='Фото', author=self.user, image=jpeg(color=c))
+            for c in ('red', 'green', 'red')
+        ]
+        stdout, stderr = self.rebuild()
+        self.assertIn('Rebuilt images: 2, failed: 0', stdout)
+        self.assertIn('images/s', stderr)
+        for post in posts:
+            post.refresh_from_db()
+            for name in settings.POST_THUMBNAILS:
+                self.assertIsNotNone(thumbnails.lookup(post.image, name))
+            self.assertIn('"jpeg"', post.image_variants)
+
+    def test_run_resumes_after_checkpoint(self):
+        """Прерванный запуск продолжается с записанного поста"""
+
+        done = Post.objects.create(
+            text='Фото', author=self.user, image=jpeg(color='blue'))
+        left = Post.objects.create(
+            text='Фото', author=self.user, image=jpeg(color='yellow'))
+        with open(self.checkpoint, 'w') as file:
+            json.dump({'last_pk': done.pk}, file)
+        stdout, _ = self.rebuild('--checkpoint', self.checkpoint)
+        self.assertIn('Rebuilt images: 1, failed: 0', stdout)
+        self.assertIsNone(thumbnails.lookup(done.image, 'card'))
+        self.assertIsNotNone(thumbnails.lookup(left.image, 'card'))
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_errors_are_reported(self):
+        """Ошибки отдельных картинок выводятся и не прерывают работу"""
+
+        Post.objects.create(
+            text='Пропавшее', author=self.user, image='posts/missing.jpg')
+        Post.objects.create(
+            text='Фото', author=self.user, image=jpeg(color='white'))
+        stdout, stderr = self.rebuild()
+        self.assertIn('Rebuilt images: 1, failed: 1', stdout)
+        self.assertIn('posts/missing.jpg', stderr)
@@ -0,0 +1,90 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from .. import search
+from ..models import Post
+
+User = get_user_model()
+
+
+@override_settings(RECORDS_PER_PAGE=2)
+class SearchTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test_author')
+        cls.best = Post.objects.create(
+            text='Котики котики котики', author=cls.user)
+        Post.objects.bulk_create(
+            Post(text=f'Про котиков и собак {i}', author=cls.user)
+            for i in range(4)
+        )
+        Post.objects.create(text='Только собаки', author=cls.user)
+
+    def setUp(self) -> None:
+        super().setUp()
+        cache.clear()
+
+    def found(self, query, **params):
+        response = self.client.get(
+            reverse('posts:search'), {'q': query, **params})
+        return response, response.context['page_obj']
+
+    def walk(self, query):
+        texts, cursor = [], ''
+        while True:
+            _, page_obj = self.found(query, cursor=cursor)
+            texts += [post.text for post in page_obj]
+            cursor = page_obj.next_cursor
+            if cursor is None:
+                return texts
+
+    def test_ranked_results_by_cursor(self):
+        """Результаты по релевантности, курсор обходит их все."""
+
+        response, page_obj = self.found('котик')
+        self.assertTemplateUsed(response, 'includes/list_posts.html')
+        self.assertEqual(page_obj[0], self.best)
+        self.assertEqual(page_obj.paginator.total, 5)
+        texts = self.walk('котик')
+        self.assertEqual(len(texts), 5)
+        self.assertEqual(len(set(texts)), 5)
+        self.assertNotIn('Только собаки', texts)
+
+    def test_index_follows_writes(self):
+        """Индекс обновляется при правке и удалении поста."""
+
+        post = Post.objects.create(text='Жирафы', author=self.user)
+        self.assertEqual(self.walk('жираф'), ['Жирафы'])
+        Post.objects.filter(pk=post.pk).update(text='Слоны')
+        self.assertEqual(self.walk('жираф'), [])
+        self.assertEqual(self.walk('слоны'), ['Слоны'])
+        post.delete()
+        self.assertEqual(self.walk('слоны'), [])
+
+    def test_query_syntax_is_escaped(self):
+        """Операторы FTS5 в запросе ищутся как обычный текст."""
+
+        for query in ('"', 'NEAR(', 'котики OR', '*', ''):
+            with self.subTest(query=query):
+                response, _ = self.found(query)
+                self.assertEqual(response.status_code, 200)
+
+    def test_rebuild_command(self):
+        """Команда восстанавливает триггеры и индекс."""
+
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TRIGGER {search.TABLE}_insert')
+        post = Post.objects.create(text='Пингвины', author=self.user)
+        self.assertEqual(self.walk('пингвины'), [])
+        call_command('rebuild_search', stdout=StringIO())
+        self.assertEqual(self.walk('пингвины'), [post.text])
+        Post.objects.create(text='Пингвины снова', author=self.user)
+        self.assertEqual(len(self.walk('пингвины')), 2)
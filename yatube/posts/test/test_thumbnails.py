@@ -0,0 +1,168 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from sorl.thumbnail.models import KVStore
+from posts import thumbnails
+from posts.generations import (bump_generation, get_generation,
+                               post_generation)
+from posts.models import Post
+
+from .utils import MediaTestCase, png, run_on_commit
+
+
+class ThumbnailTest(MediaTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_placeholder_until_generated(self):
+        """Пока миниатюры нет, показывается заглушка, а не генерация"""
+
+        post = Post.objects.create(
+            text='С картинкой', author=self.user, image=png())
+        with mock.patch.object(thumbnails, '_submit') as submit:
+            with run_on_commit():
+                response = self.client.get(
+                    reverse('posts:post_detail', args=[post.pk]))
+        self.assertContains(response, f'src="{post.image_placeholder}"')
+        submit.assert_called_with(post.image.name)
+        self.assertIsNone(thumbnails.lookup(post.image, 'card'))
+
+    def test_generated_thumbnail_is_shown(self):
+        """После генерации страница ссылается на готовую миниатюру"""
+
+        post = Post.objects.create(
+            text='С картинкой', author=self.user, image=png())
+        thumbnails.generate(post.image.name)
+        thumbnail = thumbnails.lookup(post.image, 'card')
+        self.assertIsNotNone(thumbnail)
+        response = self.client.get(
+            reverse('posts:post_detail', args=[post.pk]))
+        self.assertContains(response, f'src="{thumbnail.url}"')
+
+    def test_generated_thumbnail_refreshes_cached_pages(self):
+        """Готовая миниатюра сбрасывает страницы, закешированные с заглушкой"""
+
+        post = Post.objects.create(
+            text='С картинкой', author=self.user, image=png())
+        name = post_generation(post.pk)
+        before = get_generation(name)
+        thumbnails.generate(post.image.name)
+        after = get_generation(name)
+        self.assertNotEqual(after, before)
+        thumbnails.generate(post.image.name)
+        self.assertEqual(get_generation(name), after)
+
+    def test_create_enqueues_after_commit(self):
+        """Новый пост ставит миниатюры в очередь после коммита"""
+
+        with mock.patch.object(thumbnails, '_submit') as submit:
+            with run_on_commit():
+                self.client.post(
+                    reverse('posts:post_create'),
+                    {'text': 'Новый пост', 'image': png()},
+                )
+        post = Post.objects.get(text='Новый пост')
+        submit.assert_called_once_with(post.image.name)
+
+    def test_edit_without_new_image_does_not_enqueue(self):
+        """Правка текста не ставит миниатюры в очередь"""
+
+        post = Post.objects.create(
+            text='С картинкой', author=self.user, image=png())
+        with mock.patch.object(thumbnails, 'enqueue') as enqueue:
+            self.client.post(
+                reverse('posts:post_edit', args=[post.pk]),
+                {'text': 'Другой текст'},
+            )
+        enqueue.assert_not_called()
+
+    @override_settings(THUMBNAIL_ASYNC=False)
+    def test_sync_mode_generates_inline(self):
+        """Без фоновых задач миниатюра создаётся сразу"""
+
+        post = Post.objects.create(
+            text='С картинкой', author=self.user, image=png())
+        thumbnails.enqueue(post.image)
+        self.assertIsNotNone(thumbnails.lookup(post.image, 'card'))
+
+
+class ThumbnailLookupTest(MediaTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.posts = [
+            Post.objects.create(
+                text=f'Пост {i}', author=cls.user, image=png((i, 0, 0)))
+            for i in range(5)
+        ]
+        for post in cls.posts[:3]:
+            thumbnails.generate(post.image.name)
+
+    def lookup_all(self):
+        return thumbnails.lookup_many(
+            [post.image for post in self.posts], 'card')
+
+    def test_page_is_looked_up_in_one_query(self):
+        """Миниатюры страницы читаются из базы одним запросом"""
+
+        with CaptureQueriesContext(connection) as queries:
+            found = self.lookup_all()
+        self.assertEqual(len(queries), 1)
+        for post in self.posts[:3]:
+            self.assertIsNotNone(found[post.image.name])
+        for post in self.posts[3:]:
+            self.assertIsNone(found[post.image.name])
+
+    def test_repeated_lookup_skips_database(self):
+        """Повторный поиск обходится без запросов к базе"""
+
+        expected = self.lookup_all()
+        with self.assertNumQueries(0):
+            found = self.lookup_all()
+        self.assertEqual(
+            {name: im and im.name for name, im in found.items()},
+            {name: im and im.name for name, im in expected.items()},
+        )
+
+    @override_settings(THUMBNAIL_LRU_SIZE=2)
+    def test_lru_is_bounded(self):
+        """Память процесса хранит не больше THUMBNAIL_LRU_SIZE записей"""
+
+        self.lookup_all()
+        self.assertEqual(len(thumbnails._found), 2)
+
+    def test_deletion_elsewhere_empties_lru(self):
+        """Удаление картинки в другом процессе сбрасывает LRU этого"""
+
+        self.lookup_all()
+        self.assertTrue(thumbnails._found)
+        post = self.posts[0]
+        KVStore.objects.all().delete()
+        cache.clear()
+        bump_generation(thumbnails.THUMBNAILS)
+        self.assertIsNone(thumbnails.lookup(post.image, 'card'))
+
+    def test_feed_page_queries_do_not_grow_with_images(self):
+        """Число запросов ленты не зависит от числа картинок"""
+
+        client = Client()
+        client.force_login(self.user)
+        url = reverse('posts:index')
+        with CaptureQueriesContext(connection) as few:
+            client.get(url)
+        Post.objects.bulk_create(
+            Post(text=f'Ещё {i}', author=self.user, image=self.posts[0].image)
+            for i in range(5)
+        )
+        cache.clear()
+        with CaptureQueriesContext(connection) as many:
+            client.get(url)
+        self.assertEqual(len(many), len(few))
@@ -0,0 +1,133 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from .. import timeline
+from ..models import FeedEntry, Follow, Post, UserCounter
+from ..timeline import TimelinePaginator
+
+User = get_user_model()
+
+
+@override_settings(
+    FEED_PULL_THRESHOLD=1, FEED_PUSH_THRESHOLD=0, FEED_ASYNC=False)
+class HybridTimelineTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.other_reader = User.objects.create_user(username='other')
+        cls.star = User.objects.create_user(username='star')
+        cls.author = User.objects.create_user(username='author')
+
+    def setUp(self) -> None:
+        super().setUp()
+        cache.clear()
+        Follow.objects.create(user=self.reader, author=self.star)
+        Follow.objects.create(user=self.other_reader, author=self.star)
+        Follow.objects.create(user=self.reader, author=self.author)
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def test_popular_author_is_not_fanned_out(self):
+        """Посты популярного автора не копируются в ленты."""
+
+        post = Post.objects.create(text='Звезда', author=self.star)
+        self.assertFalse(FeedEntry.objects.filter(post=post).exists())
+
+    def test_feed_merges_pushed_and_pulled_posts(self):
+        """Лента объединяет материализованные и подтянутые посты."""
+
+        posts = [
+            Post.objects.create(text=f'Пост {i}', author=author)
+            for i, author in enumerate(
+                [self.star, self.author, self.star, self.author])
+        ]
+
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            list(response.context['page_obj']), posts[::-1])
+
+    def test_feed_stats_command(self):
+        """Команда feed_stats печатает строку на каждый порог."""
+
+        Post.objects.create(text='Пост', author=self.author)
+        out = StringIO()
+        call_command('feed_stats', '--threshold', '0', '5', stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[1].split()[0] == '0')
+
+    def feed(self):
+        response = self.client.get(reverse('posts:follow_index'))
+        return list(response.context['page_obj'])
+
+    @override_settings(FEED_PUSH_THRESHOLD=1)
+    def test_posts_stay_when_author_is_pushed_again(self):
+        """Посты, написанные в режиме pull, остаются в ленте после отписок"""
+
+        post = Post.objects.create(text='Звезда', author=self.star)
+        self.assertEqual(self.feed(), [post])
+        Follow.objects.filter(user=self.other_reader).delete()
+        self.assertTrue(
+            FeedEntry.objects.filter(user=self.reader, post=post).exists())
+        self.assertEqual(self.feed(), [post])
+
+    def test_author_is_pushed_again_under_lower_threshold(self):
+        """Автор возвращается в push только ниже FEED_PUSH_THRESHOLD"""
+
+        Follow.objects.filter(user=self.other_reader).delete()
+        post = Post.objects.create(text='Звезда', author=self.star)
+        self.assertFalse(FeedEntry.objects.filter(post=post).exists())
+        self.assertEqual(self.feed(), [post])
+
+    @override_settings(FEED_PUSH_THRESHOLD=1)
+    def test_catch_up_copies_only_pull_mode_posts(self):
+        """При возврате в push копируются только посты режима pull"""
+
+        since = UserCounter.objects.get(user=self.star).pulled_since
+        old = Post.objects.create(text='Старый', author=self.star)
+        Post.objects.filter(pk=old.pk).update(
+            pub_date=since - timedelta(days=1))
+        new = Post.objects.create(text='Новый', author=self.star)
+        Follow.objects.filter(user=self.other_reader).delete()
+        self.assertEqual(
+            list(
+                FeedEntry.objects
+                .filter(user=self.reader)
+                .values_list('post_id', flat=True)
+            ),
+            [new.pk],
+        )
+
+    @override_settings(FEED_PUSH_THRESHOLD=1, FEED_ASYNC=True)
+    def test_catch_up_runs_after_commit(self):
+        """Копирование постов режима pull уходит в фон после коммита"""
+
+        since = UserCounter.objects.get(user=self.star).pulled_since
+        with mock.patch.object(timeline, '_submit') as submit:
+            with mock.patch.object(
+                    timeline.transaction, 'on_commit',
+                    side_effect=lambda func: func()):
+                Follow.objects.filter(user=self.other_reader).delete()
+        submit.assert_called_once_with(self.star.pk, since)
+
+    def test_total_counts_pushed_posts_once(self):
+        """Посты, разосланные до перехода порога, считаются один раз"""
+
+        post = Post.objects.create(text='Пост', author=self.author)
+        Follow.objects.create(user=self.other_reader, author=self.author)
+        Post.objects.create(text='Ещё', author=self.author)
+        paginator = TimelinePaginator(
+            Post.objects.all(), 10, user=self.reader)
+        self.assertEqual(paginator.total, 2)
+        self.assertEqual(len(paginator.fetch(limit=None)), 2)
+        self.assertIn(post, paginator.fetch(limit=None))
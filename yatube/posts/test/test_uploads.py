@@ -0,0 +1,125 @@
+import os
+import struct
+import tracemalloc
+import zlib
+
+from django.test import Client, RequestFactory, override_settings
+from django.urls import reverse
+from PIL import Image
+from posts.models import Post
+
+from .utils import MediaTestCase, encoded, upload
+
+ORIENTATION = 0x0112
+MAKE = 0x010F
+
+
+def png_header(width, height):
+    """Return a PNG that declares ``width`` x ``height`` but has no data."""
+
+    def chunk(kind, data):
+        crc = zlib.crc32(kind + data)
+        return struct.pack('>I', len(data)) + kind + data + struct.pack(
+            '>I', crc)
+
+    header = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header)
+            + chunk(b'IEND', b''))
+
+
+def parse_peak(request):
+    """Return the peak of Python allocations while parsing ``request``."""
+
+    tracemalloc.start()
+    try:
+        request.FILES
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+class UploadTest(MediaTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def create(self, content, **kwargs):
+        return self.client.post(
+            reverse('posts:post_create'),
+            {'text': 'Фото', 'image': upload(content, **kwargs)},
+        )
+
+    def assertRejected(self, response, message):
+        self.assertFalse(Post.objects.filter(text='Фото').exists())
+        self.assertIn(message, str(response.context['form'].errors['image']))
+
+    def test_upload_is_streamed_in_chunks(self):
+        """Загрузка пишется на диск кусками, а не читается в память"""
+
+        size = 4 * 2 ** 20
+        factory = RequestFactory()
+        content = os.urandom(size)
+
+        request = factory.post('/', {'image': upload(content)})
+        peak = parse_peak(request)
+        self.assertTrue(hasattr(request.FILES['image'],
+                                'temporary_file_path'))
+        self.assertLess(peak, size / 8)
+
+        with override_settings(
+                FILE_UPLOAD_HANDLERS=[
+                    'django.core.files.uploadhandler.MemoryFileUploadHandler'],
+                FILE_UPLOAD_MAX_MEMORY_SIZE=2 * size):
+            request = factory.post('/', {'image': upload(content)})
+            in_memory = parse_peak(request)
+        self.assertGreater(in_memory, size)
+
+    @override_settings(IMAGE_UPLOAD_MAX_BYTES=1000)
+    def test_large_file_is_rejected(self):
+        """Слишком большой файл отклоняется и не сохраняется"""
+
+        content = encoded(Image.effect_noise((100, 100), 50))
+        self.assertGreater(len(content), 1000)
+        self.assertRejected(self.create(content), 'Файл больше')
+
+    def test_decompression_bomb_is_rejected_from_header(self):
+        """Размеры из заголовка проверяются до декодирования"""
+
+        for width, height in ((10000, 5000), (30000, 30000)):
+            with self.subTest(size=(width, height)):
+                response = self.create(
+                    png_header(width, height),
+                    name='bomb.png', content_type='image/png')
+                self.assertRejected(response, 'мегапикселей')
+
+    def test_unsupported_format_is_rejected(self):
+        """Картинка неподдерживаемого формата отклоняется"""
+
+        content = encoded(Image.new('RGB', (10, 10)), 'BMP')
+        response = self.create(
+            content, name='image.bmp', content_type='image/bmp')
+        self.assertRejected(response, 'Формат BMP не поддерживается')
+
+    @override_settings(IMAGE_MAX_SIDE=800)
+    def test_large_image_is_downsized(self):
+        """Большая картинка уменьшается при сохранении"""
+
+        self.create(encoded(Image.new('RGB', (3000, 2000), 'red')))
+        post = Post.objects.get(text='Фото')
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (800, 533))
+
+    def test_metadata_is_stripped(self):
+        """EXIF удаляется, а поворот из него применяется к картинке"""
+
+        exif = Image.Exif()
+        exif[MAKE] = 'Camera'
+        exif[ORIENTATION] = 6
+        self.create(encoded(Image.new('RGB', (300, 200)), exif=exif))
+        post = Post.objects.get(text='Фото')
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (200, 300))
+            self.assertNotIn('exif', image.info)
+            self.assertEqual(dict(image.getexif()), {})
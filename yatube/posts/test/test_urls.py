@@ -1,6 +1,7 @@
 from http import HTTPStatus
 
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.test import Client, TestCase
 
 from ..models import Group, Post
@@ -45,6 +46,10 @@ class StaticURLTests(TestCase):
             '/create/': 'posts/create_post.html',
         }
 
+    def setUp(self) -> None:
+        super().setUp()
+        cache.clear()
+
     def test_urls_correct_for_guest_client(self):
         """Доступность всех адресов для неавторизованого пользователя"""
         static_urls = [
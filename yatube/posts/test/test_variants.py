@@ -0,0 +1,108 @@
+import hashlib
+import json
+from unittest import mock, skipUnless
+
+from django.core.files.storage import default_storage
+from django.test import Client, override_settings
+from django.urls import reverse
+from PIL import Image, features
+from posts import variants
+from posts.models import Post
+
+from .utils import MediaTestCase, jpeg
+
+
+@override_settings(IMAGE_VARIANT_FORMATS=('jpeg',))
+class VariantTest(MediaTestCase):
+
+    def test_build_stores_hashed_widths(self):
+        """Варианты всех ширин сохраняются под хешем содержимого"""
+
+        post = Post.objects.create(
+            text='Фото', author=self.user, image=jpeg(1200, 800))
+        variants.build(post.image.name)
+        post.refresh_from_db()
+        manifest = json.loads(post.image_variants)
+        self.assertEqual(
+            [width for width, _ in manifest['jpeg']], [320, 640, 960])
+        for width, name in manifest['jpeg']:
+            with default_storage.open(name) as stored:
+                data = stored.read()
+                stored.seek(0)
+                size = Image.open(stored).size
+            self.assertIn(hashlib.sha256(data).hexdigest()[:20], name)
+            self.assertEqual(size, (width, round(width * 339 / 960)))
+
+    def test_small_image_is_not_upscaled(self):
+        """Маленькая картинка не растягивается до больших ширин"""
+
+        post = Post.objects.create(
+            text='Фото', author=self.user, image=jpeg(500, 300))
+        variants.build(post.image.name)
+        post.refresh_from_db()
+        manifest = json.loads(post.image_variants)
+        self.assertEqual([width for width, _ in manifest['jpeg']], [320])
+
+    def test_build_keeps_edit_time(self):
+        """Сборка вариантов не меняет updated_at и сбрасывает кеш один раз"""
+
+        posts = [
+            Post.objects.create(
+                text='Фото', author=self.user, image=jpeg(600, 400))
+            for _ in range(3)
+        ]
+        with mock.patch(
+                'posts.invalidation.bump_generation') as bump_generation:
+            variants.build(posts[0].image.name)
+        bump_generation.assert_called_once()
+        for post in posts:
+            updated_at = post.updated_at
+            post.refresh_from_db()
+            self.assertTrue(post.image_variants)
+            self.assertEqual(post.updated_at, updated_at)
+
+    def test_shared_image_reuses_variants(self):
+        """Пост с той же картинкой получает готовые варианты"""
+
+        first = Post.objects.create(
+            text='Фото', author=self.user, image=jpeg(1000, 500))
+        variants.build(first.image.name)
+        second = Post.objects.create(
+            text='Репост', author=self.user, image=jpeg(1000, 500))
+        self.assertEqual(first.image.name, second.image.name)
+        with mock.patch.object(variants, 'render') as render:
+            variants.build(second.image.name)
+        render.assert_not_called()
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(second.image_variants, first.image_variants)
+
+    def test_pages_render_srcset_after_build(self):
+        """После сборки страницы показывают srcset вместо заглушки"""
+
+        post = Post.objects.create(
+            text='Фото', author=self.user, image=jpeg(1200, 800))
+        client = Client()
+        detail = reverse('posts:post_detail', args=[post.pk])
+        self.assertContains(
+            client.get(detail), f'src="{post.image_placeholder}"')
+        variants.build(post.image.name)
+        for url in (detail, reverse('posts:index')):
+            with self.subTest(url=url):
+                response = client.get(url)
+                self.assertContains(response, 'srcset=')
+                self.assertContains(response, ' 960w')
+                self.assertNotContains(
+                    response, f'src="{post.image_placeholder}"')
+
+    @skipUnless(features.check('webp'), 'Pillow without WebP')
+    @override_settings(IMAGE_VARIANT_FORMATS=('webp', 'jpeg'))
+    def test_webp_source_before_jpeg_fallback(self):
+        """WebP отдаётся через source, JPEG остаётся запасным"""
+
+        post = Post.objects.create(
+            text='Фото', author=self.user, image=jpeg(1200, 800))
+        variants.build(post.image.name)
+        response = Client().get(reverse('posts:post_detail', args=[post.pk]))
+        self.assertContains(response, 'type="image/webp"')
+        self.assertContains(response, '.jpg 960w')
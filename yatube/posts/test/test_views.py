@@ -5,12 +5,13 @@ from django import forms
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
-from django.core.cache.utils import make_template_fragment_key
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
 from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
-from ..models import Comment, Follow, Group, Post
+from ..models import Comment, FeedEntry, Follow, Group, Post
 from .utils import chek_paginator
 
 User = get_user_model()
@@ -214,26 +215,42 @@ class YatubePagesTest(TestCase):
                 self.assertEqual(post.pk, expected_id)
 
     def test_cache_index_page(self):
-        check_text = 'Тестируем кеширование'
+        """Лента берётся из кеша, пока в ней ничего не изменилось."""
+        cache.clear()
         new_post = Post.objects.create(
-            text=check_text,
-            author=self.user_1,
+            text='Тестируем кеширование',
+            author=self.user_2,
             group=self.group_1
         )
-        # не дождался ответа в слаке, сделал так как обсудили с ребатами
-        response = self.authorized_client.get(reverse('posts:index'))
-        key = make_template_fragment_key(
-            'index_page',
-            [response.context['page_obj']]
-        )
-        cache.delete(key)
+        page_1 = self.authorized_client.get(reverse('posts:index')).content
+        # update() не отправляет сигналов, поэтому версия ленты прежняя.
+        Post.objects.filter(pk=new_post.pk).update(text='Изменённый текст')
+        page_2 = self.authorized_client.get(reverse('posts:index')).content
+        self.assertEqual(page_1, page_2, 'Кеш не работает')
 
+    def test_cache_index_page_invalidation(self):
+        """Новый пост виден сразу, а не после истечения кеша."""
+        cache.clear()
+        self.authorized_client.get(reverse('posts:index'))
+        Post.objects.create(
+            text='Свежий пост',
+            author=self.user_2,
+            group=self.group_1
+        )
         response = self.authorized_client.get(reverse('posts:index'))
-        page_1 = response.content
-        Post.objects.get(pk=new_post.pk).delete()
+        self.assertContains(response, 'Свежий пост')
+
+    def test_cache_index_page_is_not_shared_with_author(self):
+        """Ссылки редактирования не попадают в кеш других читателей."""
+        cache.clear()
+        edit_url = reverse('posts:post_edit', args=[self.posts[0].pk])
         response = self.authorized_client.get(reverse('posts:index'))
-        page_2 = response.content
-        self.assertEqual(page_1, page_2, 'Кеш не работает')
+        self.assertContains(response, edit_url)
+
+        reader = Client()
+        reader.force_login(self.user_2)
+        response = reader.get(reverse('posts:index'))
+        self.assertNotContains(response, edit_url)
 
 
 # -------------------------------------------------------------------
@@ -370,6 +387,47 @@ class PaginatorViewsTest(TestCase):
             True
         )
 
+    def test_paginator_cursor_next_and_previous(self):
+        """Курсоры ведут на соседние страницы без пропусков и повторов."""
+        client = PaginatorViewsTest.authorized_client
+        url = reverse('posts:index')
+        page_1 = client.get(url).context['page_obj']
+        self.assertFalse(page_1.has_previous())
+
+        page_2 = client.get(
+            url, {'cursor': page_1.next_cursor}).context['page_obj']
+        self.assertEqual(page_2.number, 2)
+        self.assertFalse(page_2.has_next())
+        self.assertEqual(
+            [post.pk for post in page_1] + [post.pk for post in page_2],
+            list(range(14, 0, -1))
+        )
+
+        back = client.get(
+            url, {'cursor': page_2.previous_cursor}).context['page_obj']
+        self.assertEqual(back.number, 1)
+        self.assertEqual(list(back), list(page_1))
+
+    def test_paginator_cursor_does_not_count(self):
+        """Страница по курсору не выполняет COUNT(*)."""
+        client = PaginatorViewsTest.authorized_client
+        url = reverse('posts:index')
+        cursor = client.get(url).context['page_obj'].next_cursor
+        with CaptureQueriesContext(connection) as queries:
+            client.get(url, {'cursor': cursor})
+        for query in queries:
+            with self.subTest(sql=query['sql']):
+                self.assertNotIn('COUNT(*)', query['sql'])
+                self.assertNotIn('OFFSET', query['sql'])
+
+    def test_paginator_broken_cursor(self):
+        """Испорченный курсор открывает первую страницу."""
+        response = PaginatorViewsTest.authorized_client.get(
+            reverse('posts:index'), {'cursor': 'broken'})
+        self.assertEqual(response.context['page_obj'].number, 1)
+        self.assertEqual(
+            len(response.context['page_obj']), settings.RECORDS_PER_PAGE)
+
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
@@ -484,6 +542,138 @@ class CommentViewTest(TestCase):
         self.assertEqual(count_comments, Comment.objects.all().count())
 
 
+@override_settings(COMMENTS_PER_PAGE=3)
+class CommentPagesTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test_author')
+        cls.post = Post.objects.create(text='Пост', author=cls.user)
+        for i in range(7):
+            Comment.objects.create(
+                post=cls.post, author=cls.user, text=f'Комментарий {i}')
+
+    def setUp(self) -> None:
+        super().setUp()
+        cache.clear()
+
+    def test_detail_renders_newest_page(self):
+        """На странице поста только первая страница комментариев."""
+
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.post.pk]))
+        comments = response.context['comments']
+        self.assertEqual(
+            [comment.text for comment in comments],
+            ['Комментарий 6', 'Комментарий 5', 'Комментарий 4'],
+        )
+        self.assertContains(
+            response,
+            reverse('posts:post_comments', args=[self.post.pk])
+            + f'?cursor={comments.next_cursor}',
+        )
+
+    def test_fragment_walks_all_comments(self):
+        """Фрагменты отдают остальные комментарии без шаблона страницы."""
+
+        url = reverse('posts:post_comments', args=[self.post.pk])
+        texts = []
+        cursor = None
+        while True:
+            with self.assertNumQueries(1):
+                response = self.client.get(url, {'cursor': cursor or ''})
+            self.assertTemplateNotUsed(response, 'base.html')
+            page_obj = response.context['comments']
+            texts += [comment.text for comment in page_obj]
+            cursor = page_obj.next_cursor
+            if cursor is None:
+                break
+        self.assertEqual(
+            texts, [f'Комментарий {i}' for i in reversed(range(7))])
+
+
+class FeedFragmentTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test_author')
+        cls.reader = User.objects.create_user(username='test_reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        Follow.objects.create(user=cls.reader, author=cls.user)
+        for i in range(15):
+            Post.objects.create(
+                text=f'Пост {i}', author=cls.user, group=cls.group)
+
+    def setUp(self) -> None:
+        super().setUp()
+        cache.clear()
+        self.client.force_login(self.reader)
+
+    def test_fragments_continue_the_feed(self):
+        """Фрагмент отдаёт только карточки следующей страницы."""
+
+        pages = {
+            reverse('posts:index'): reverse('posts:index_more'),
+            reverse('posts:group_list', args=[self.group.slug]):
+                reverse('posts:group_list_more', args=[self.group.slug]),
+            reverse('posts:profile', args=[self.user.username]):
+                reverse('posts:profile_more', args=[self.user.username]),
+            reverse('posts:follow_index'):
+                reverse('posts:follow_index_more'),
+        }
+        for url, more_url in pages.items():
+            with self.subTest(url=url):
+                page_obj = self.client.get(url).context['page_obj']
+                cursor = page_obj.next_cursor
+                self.assertContains(
+                    self.client.get(url), f'{more_url}?cursor={cursor}')
+
+                response = self.client.get(more_url, {'cursor': cursor})
+                self.assertTemplateUsed(response, 'includes/post_list.html')
+                self.assertTemplateNotUsed(response, 'base.html')
+                texts = [post.text for post in response.context['page_obj']]
+                self.assertEqual(
+                    texts, [f'Пост {i}' for i in reversed(range(5))])
+                self.assertEqual(response['X-Next-Cursor'], '')
+                self.assertNotContains(response, 'data-more')
+
+    def test_fragment_from_page_cache_keeps_cursor(self):
+        """Курсор в заголовке сохраняется и при отдаче из кеша."""
+
+        guest = Client()
+        url = reverse('posts:index_more')
+        cursor = guest.get(url)['X-Next-Cursor']
+        self.assertTrue(cursor)
+        response = guest.get(url)
+        self.assertEqual(response['X-Page-Cache'], 'HIT')
+        self.assertEqual(response['X-Next-Cursor'], cursor)
+
+    def test_fragments_of_missing_pages_are_404(self):
+        """Фрагменты несуществующих страниц отвечают 404, как и страницы."""
+
+        for url in (
+            reverse('posts:group_list_more', args=['missing']),
+            reverse('posts:profile_more', args=['missing']),
+            reverse('posts:post_comments', args=[10 ** 6]),
+        ):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_profile_fragment_follows_group_rename(self):
+        """Кешированный фрагмент профиля сбрасывается при смене группы."""
+
+        guest = Client()
+        url = reverse('posts:profile_more', args=[self.user.username])
+        self.assertContains(guest.get(url), '/group/group/')
+        group = Group.objects.get(pk=self.group.pk)
+        group.slug = 'renamed'
+        group.save()
+        self.assertContains(guest.get(url), '/group/renamed/')
+
+
 class FollowTest(TestCase):
 
     @classmethod
@@ -565,3 +755,178 @@ class FollowTest(TestCase):
             not response.context['page_obj'],
             'Лента не работает для не подписчика'
         )
+
+    def test_follow_backfills_and_unfollow_prunes_feed(self):
+        """Подписка переносит старые посты в ленту, отписка убирает."""
+
+        self.authorized_client_f.get(
+            reverse('posts:profile_follow', args=[self.author.username])
+        )
+        self.assertTrue(
+            FeedEntry.objects.filter(
+                user=self.user_follower, post=self.post).exists()
+        )
+
+        self.authorized_client_f.get(
+            reverse('posts:profile_unfollow', args=[self.author.username])
+        )
+        self.assertFalse(
+            FeedEntry.objects.filter(user=self.user_follower).exists()
+        )
+
+    def test_removed_post_leaves_feed(self):
+        """Удалённый пост пропадает из ленты подписчика."""
+
+        Follow.objects.create(user=self.user_follower, author=self.author)
+        new_post = Post.objects.create(text='Пост', author=self.author)
+        self.client.force_login(self.author)
+        self.client.get(reverse('posts:post_remove', args=[new_post.pk]))
+
+        response = self.authorized_client_f.get(reverse('posts:follow_index'))
+        self.assertNotIn(new_post, response.context['page_obj'])
+        self.assertIn(self.post, response.context['page_obj'])
+
+
+class PageWindowTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test_author')
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=cls.user) for i in range(55))
+
+    def setUp(self) -> None:
+        super().setUp()
+        cache.clear()
+
+    def test_total_is_cached_until_posts_change(self):
+        """Размер ленты считается один раз до новой записи."""
+
+        url = reverse('posts:index')
+        # Anonymous visitors get the whole page from the page cache.
+        self.client.force_login(self.user)
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.context['page_obj'].paginator.total, 55)
+        self.assertFalse([q for q in queries if 'COUNT' in q['sql']])
+
+        Post.objects.create(text='Новый пост', author=self.user)
+        response = self.client.get(url)
+        self.assertEqual(response.context['page_obj'].paginator.total, 56)
+
+    def test_window_and_last_page(self):
+        """Навигация показывает соседние и последнюю страницы."""
+
+        url = reverse('posts:index')
+        response = self.client.get(url, {'page': 'last'})
+        page_obj = response.context['page_obj']
+        self.assertEqual(page_obj.number, 6)
+        self.assertEqual(len(page_obj), 5)
+        self.assertFalse(page_obj.has_next())
+        self.assertEqual(page_obj[0].text, 'Пост 4')
+
+        response = self.client.get(url, {'page': 3})
+        content = response.content.decode()
+        for label in ('href="?page=1"', 'href="?page=last"', '&hellip;'):
+            with self.subTest(label=label):
+                self.assertIn(label, content)
+        self.assertNotIn('?page=4', content)
+
+
+class ConditionalGetTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='test_author')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        cls.post = Post.objects.create(
+            text='Пост', author=cls.author, group=cls.group)
+
+    def setUp(self) -> None:
+        super().setUp()
+        cache.clear()
+        self.client.force_login(self.author)
+
+    def test_not_modified_without_page_query(self):
+        """Неизменная страница отвечает 304 без запроса ленты."""
+
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', args=[self.group.slug]),
+            reverse('posts:profile', args=[self.author.username]),
+            reverse('posts:post_detail', args=[self.post.pk]),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertFalse(
+                    [q for q in queries if 'posts_post"."text' in q['sql']])
+
+    def test_edit_changes_validators(self):
+        """Правка поста меняет ETag и Last-Modified."""
+
+        url = reverse('posts:post_detail', args=[self.post.pk])
+        response = self.client.get(url)
+        etag, modified = response['ETag'], response['Last-Modified']
+        self.client.post(
+            reverse('posts:post_edit', args=[self.post.pk]),
+            {'text': 'Новый текст', 'group': self.group.pk},
+        )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.post.refresh_from_db()
+        self.assertGreater(self.post.updated_at, self.post.pub_date)
+        self.assertIsNotNone(modified)
+
+    def test_group_rename_changes_profile_etag(self):
+        """Переименование группы поста меняет ETag профиля автора."""
+
+        url = reverse('posts:profile', args=[self.author.username])
+        etag = self.client.get(url)['ETag']
+        group = Group.objects.get(pk=self.group.pk)
+        group.slug = 'renamed'
+        group.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'renamed')
+
+    def test_new_login_changes_etag(self):
+        """После нового входа страница с формой не отвечает 304."""
+
+        client = Client()
+        client.force_login(self.author)
+        url = reverse('posts:post_detail', args=[self.post.pk])
+        etag = client.get(url)['ETag']
+        self.assertEqual(
+            client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        client.logout()
+        client.force_login(self.author)
+        client.get(url)
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'csrfmiddlewaretoken')
+
+    def test_viewers_get_own_validators(self):
+        """ETag зависит от зрителя и открытой страницы."""
+
+        url = reverse('posts:index')
+        etag = self.client.get(url)['ETag']
+        self.assertNotEqual(Client().get(url)['ETag'], etag)
+        self.assertNotEqual(self.client.get(url, {'page': 2})['ETag'], etag)
+
+    def test_page_cache_hit_is_conditional(self):
+        """Гость с актуальным ETag получает 304 и из кеша страниц."""
+
+        guest = Client()
+        url = reverse('posts:index')
+        etag = guest.get(url)['ETag']
+        response = guest.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
@@ -1,7 +1,22 @@
+import io
+import shutil
+import tempfile
+from contextlib import ContextDecorator
 from http import HTTPStatus
 from typing import Dict, List
+from unittest import mock
 
 from bs4 import BeautifulSoup
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+
+from .. import thumbnails
+from ..models import User
 
 
 def check_urls_templates(self, client, names: Dict):
@@ -44,3 +59,96 @@ def find_post_by_text(text: str, sourse: str) -> bool:
     soup = BeautifulSoup(sourse, 'html.parser')
     first_post = soup.main.p.p.text
     return text == first_post
+
+
+class query_budget(ContextDecorator):
+    """Fail if the wrapped block runs more than ``budget`` queries.
+
+    Works both as a context manager and as a test method decorator.
+    """
+
+    def __init__(self, budget: int, using: str = DEFAULT_DB_ALIAS):
+        self.budget = budget
+        self.capture = CaptureQueriesContext(connections[using])
+
+    def __enter__(self):
+        self.capture.__enter__()
+        return self.capture
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.capture.__exit__(exc_type, exc_value, traceback)
+        if exc_type is not None:
+            return False
+        executed = len(self.capture)
+        if executed > self.budget:
+            queries = '\n'.join(
+                f'{i}. {query["sql"]}'
+                for i, query in enumerate(self.capture.captured_queries, 1)
+            )
+            raise AssertionError(
+                f'{executed} queries executed, budget is {self.budget}:\n'
+                f'{queries}'
+            )
+        return False
+
+
+def encoded(image, image_format='JPEG', **params) -> bytes:
+    output = io.BytesIO()
+    image.save(output, image_format, **params)
+    return output.getvalue()
+
+
+def upload(content, name='photo.jpg', content_type='image/jpeg'):
+    return SimpleUploadedFile(
+        name=name, content=content, content_type=content_type)
+
+
+def jpeg(width=400, height=300, color='red'):
+    """Return an uploaded JPEG; images of other colours are stored apart."""
+
+    return upload(encoded(Image.new('RGB', (width, height), color)))
+
+
+def png(color='black', name='image.png'):
+    """Return an uploaded 8x8 PNG; the same colour gives the same file."""
+
+    return upload(
+        encoded(Image.new('RGB', (8, 8), color), 'PNG'), name, 'image/png')
+
+
+def run_on_commit():
+    """Run ``on_commit`` callbacks at once inside test transactions."""
+
+    return mock.patch.object(
+        transaction, 'on_commit', side_effect=lambda func: func())
+
+
+class MediaTestCase(TestCase):
+    """Test case saving uploads to a temporary ``MEDIA_ROOT``.
+
+    Files are named by their content, so tests of different classes
+    share thumbnails. sorl caches them outside the database, which the
+    rollback does not reach: caches are cleared before the fixtures of
+    each class and before each test.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        cls.media_settings = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media_settings.enable()
+        cache.clear()
+        thumbnails.forget()
+        super().setUpClass()
+        cls.user = User.objects.create(username='photographer')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.media_settings.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        thumbnails.forget()
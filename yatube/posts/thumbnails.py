@@ -0,0 +1,301 @@
+"""Thumbnails of post images, generated off the request path.
+
+Templates never make thumbnails themselves. ``post_create`` and
+``post_edit`` enqueue every geometry of ``POST_THUMBNAILS`` and the
+responsive variants (see ``posts.variants``) of the new image to a small
+in-process worker pool once the transaction commits,
+and templates look thumbnails up in sorl's key-value store, showing a
+placeholder (and enqueueing the image again) until they exist.
+
+Feed pages look up the thumbnails of all their posts at once: one
+``get_many`` on sorl's cache and one query on its table for the keys
+the cache lacks. Found thumbnails are also kept in a bounded in-process
+LRU (``THUMBNAIL_LRU_SIZE``) in front of the shared store. Deleting a
+source bumps the ``THUMBNAILS`` generation, which empties the LRU of
+every process on its next lookup: a re-upload of the same content gets
+the same name and must not find the deleted thumbnails.
+
+``manage.py rebuild_thumbnails`` renders existing images in worker
+processes with ``render`` and stores the result with ``record``.
+"""
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import (ImageFile, deserialize_image_file,
+                                   serialize_image_file)
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE, KVStore
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from . import invalidation, variants
+from .generations import bump_generation, get_generation
+from .models import post_image_storage
+
+logger = logging.getLogger(__name__)
+
+THUMBNAILS = 'thumbnails'
+
+_executor = None
+_pending = {}
+_lock = threading.Lock()
+_found = OrderedDict()
+_found_generation = None
+_found_lock = threading.Lock()
+
+
+def thumbnail_options(source, options):
+    """Return ``options`` completed the way sorl names thumbnails."""
+
+    backend = default.backend
+    options = dict(options)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    return options
+
+
+def thumbnail_file(image, name):
+    """Return the unsaved ``ImageFile`` the ``name`` thumbnail would be."""
+
+    geometry, options = settings.POST_THUMBNAILS[name]
+    source = ImageFile(image)
+    filename = default.backend._get_thumbnail_filename(
+        source, geometry, thumbnail_options(source, options))
+    return ImageFile(filename, default.storage)
+
+
+def _remember(key, thumbnail):
+    with _found_lock:
+        _found[key] = thumbnail
+        _found.move_to_end(key)
+        while len(_found) > settings.THUMBNAIL_LRU_SIZE:
+            _found.popitem(last=False)
+
+
+def _recall(key):
+    with _found_lock:
+        thumbnail = _found.get(key)
+        if thumbnail is not None:
+            _found.move_to_end(key)
+        return thumbnail
+
+
+def _fetch_stored(keys):
+    """Read sorl's records of ``keys`` in one cache and one DB round trip.
+
+    Return ``{key: ImageFile}`` of the thumbnails that exist.
+    """
+
+    kvstore = default.kvstore
+    if not isinstance(kvstore, KVStore):
+        found = {}
+        for key in keys:
+            thumbnail = kvstore._get(key)
+            if thumbnail is not None:
+                found[key] = thumbnail
+        return found
+
+    raw_keys = {add_prefix(key): key for key in keys}
+    values = kvstore.cache.get_many(list(raw_keys))
+    missing = set(raw_keys) - set(values)
+    if missing:
+        stored = dict(
+            KVStoreModel.objects
+            .filter(key__in=missing)
+            .values_list('key', 'value')
+        )
+        # Remember misses too, as sorl does, so that they are not
+        # queried again until the thumbnail is saved.
+        fetched = {key: stored.get(key, EMPTY_VALUE) for key in missing}
+        kvstore.cache.set_many(fetched, sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+        values.update(fetched)
+    return {
+        raw_keys[raw_key]: deserialize_image_file(value)
+        for raw_key, value in values.items() if value != EMPTY_VALUE
+    }
+
+
+def lookup_many(images, name):
+    """Return ``{image name: thumbnail or None}`` for ``images``.
+
+    Only the key-value stores are consulted; nothing is generated.
+    """
+
+    global _found_generation
+    generation = get_generation(THUMBNAILS)
+    with _found_lock:
+        if generation != _found_generation:
+            _found.clear()
+            _found_generation = generation
+    wanted = {image.name: thumbnail_file(image, name).key
+              for image in images if image}
+    result = {}
+    unknown = []
+    for image_name, key in wanted.items():
+        result[image_name] = _recall(key)
+        if result[image_name] is None:
+            unknown.append(key)
+    if unknown:
+        found = _fetch_stored(unknown)
+        for image_name, key in wanted.items():
+            if key in found:
+                result[image_name] = found[key]
+                _remember(key, found[key])
+    return result
+
+
+def forget():
+    """Empty the LRU of every process, e.g. after deleting a source."""
+
+    bump_generation(THUMBNAILS)
+    with _found_lock:
+        _found.clear()
+
+
+def lookup(image, name):
+    """Return the stored ``name`` thumbnail of ``image`` or None."""
+
+    return lookup_many([image], name).get(image.name)
+
+
+def source_file(image_name):
+    """Return the sorl source of a post image named ``image_name``.
+
+    Thumbnails are keyed by the source name and storage, which must be
+    the storage of ``Post.image`` for templates to find them.
+    """
+
+    return ImageFile(image_name, post_image_storage)
+
+
+def generate(image_name):
+    """Make every configured thumbnail of ``image_name``.
+
+    Pages rendered with a placeholder are cached under the generations
+    of their posts, which are bumped once a missing thumbnail is stored.
+    """
+
+    kvstore = default.kvstore
+    source = source_file(image_name)
+    stored = False
+    for name, (geometry, options) in settings.POST_THUMBNAILS.items():
+        thumbnail = thumbnail_file(source, name)
+        if kvstore.get(thumbnail) is None:
+            get_thumbnail(source, geometry, **options)
+            stored = stored or kvstore.get(thumbnail) is not None
+    if stored:
+        invalidation.bump_image(image_name)
+
+
+def render(image_name, force=False):
+    """Write the thumbnail files of ``image_name``, decoding it once.
+
+    Unlike ``generate`` the key-value store is left alone, so this may
+    run in a process without a database connection. Files already there
+    are kept unless ``force`` is set. Return the serialized source and
+    thumbnails for ``record``.
+    """
+
+    backend = default.backend
+    engine = default.engine
+    source = source_file(image_name)
+    source_image = None
+    made = []
+    try:
+        for geometry, options in settings.POST_THUMBNAILS.values():
+            options = thumbnail_options(source, options)
+            thumbnail = ImageFile(
+                backend._get_thumbnail_filename(source, geometry, options),
+                default.storage,
+            )
+            if force or not thumbnail.exists():
+                if source_image is None:
+                    source_image = engine.get_image(source)
+                    source.set_size(engine.get_image_size(source_image))
+                options['image_info'] = engine.get_image_info(source_image)
+                backend._create_thumbnail(
+                    source_image, geometry, options, thumbnail)
+                backend._create_alternative_resolutions(
+                    source_image, geometry, options, thumbnail.name)
+            else:
+                thumbnail.set_size()
+            made.append(serialize_image_file(thumbnail))
+    finally:
+        if source_image is not None:
+            engine.cleanup(source_image)
+    return serialize_image_file(source), made
+
+
+def record(source, made):
+    """Store the result of ``render`` in sorl's key-value store."""
+
+    kvstore = default.kvstore
+    source = kvstore.get_or_set(deserialize_image_file(source))
+    for thumbnail in made:
+        kvstore.set(deserialize_image_file(thumbnail), source)
+
+
+def process(image_name):
+    """Make the thumbnails and the responsive variants of ``image_name``."""
+
+    generate(image_name)
+    variants.build(image_name)
+
+
+def _run(image_name):
+    try:
+        process(image_name)
+    except Exception:
+        logger.exception('Thumbnails of %s failed', image_name)
+    finally:
+        with _lock:
+            _pending.pop(image_name, None)
+        close_old_connections()
+
+
+def _submit(image_name):
+    global _executor
+    with _lock:
+        if image_name in _pending:
+            return
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails',
+            )
+        _pending[image_name] = _executor.submit(_run, image_name)
+
+
+def enqueue(image):
+    """Generate thumbnails of ``image`` once the current transaction ends.
+
+    With ``THUMBNAIL_ASYNC`` off they are generated right away instead.
+    """
+
+    if not image:
+        return
+    if not settings.THUMBNAIL_ASYNC:
+        process(image.name)
+        return
+    name = image.name
+    transaction.on_commit(lambda: _submit(name))
+
+
+def drain(timeout=None):
+    """Wait for the queued thumbnails, e.g. before a process exits."""
+
+    with _lock:
+        futures = list(_pending.values())
+    wait(futures, timeout)
@@ -0,0 +1,295 @@
+"""Materialized subscription feeds.
+
+Every new post is copied into the feed of each follower of its author
+(fan-out on write), so reading ``follow_index`` is a single range scan
+over ``FeedEntry`` instead of a join through ``Follow``.
+
+Authors with more than ``FEED_PULL_THRESHOLD`` followers are switched to
+pull mode (``UserCounter.pulled_since``): their posts are not fanned out
+but pulled at read time and merged with the pushed feed. They switch
+back only at ``FEED_PUSH_THRESHOLD`` followers or fewer, so an author
+hovering around one threshold does not flip on every follow. Writes
+check the mode in the database, reads in a short-lived cached set that
+is dropped whenever an author switches.
+
+A new follower gets at most ``FEED_BACKFILL_POSTS`` older posts of an
+author copied into the feed, whatever the mode; older ones stay on the
+author's profile. When an author is pushed again the posts written in
+pull mode are copied to every follower in a background thread once the
+transaction commits (at once with ``FEED_ASYNC`` off), so none
+disappear from their feeds.
+"""
+import heapq
+import logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .generations import FEED, bump_generation, follower_generation
+from .models import FeedEntry, Follow, Post, UserCounter
+from .utils import CursorPaginator, keyset_slice
+
+logger = logging.getLogger(__name__)
+
+PULLED_AUTHORS_KEY = 'feed:pulled_authors:{}'
+
+_executor = None
+
+
+def pulled_authors(threshold=None):
+    """Return ids of authors whose posts are pulled instead of pushed.
+
+    ``threshold`` replaces the recorded modes with a follower count, as
+    ``feed_stats`` does to compare thresholds.
+    """
+
+    key = PULLED_AUTHORS_KEY.format(threshold)
+    authors = cache.get(key)
+    if authors is None:
+        if threshold is None:
+            counters = UserCounter.objects.filter(pulled_since__isnull=False)
+        else:
+            counters = UserCounter.objects.filter(
+                followers_count__gt=threshold)
+        authors = frozenset(counters.values_list('user_id', flat=True))
+        cache.set(key, authors, settings.FEED_PULLED_CACHE_TIMEOUT)
+    return authors
+
+
+def is_pulled(author_id):
+    """Return whether the author's posts are pulled, asking the database."""
+
+    return UserCounter.objects \
+        .filter(user_id=author_id, pulled_since__isnull=False) \
+        .exists()
+
+
+def push(rows):
+    """Push ``(post_id, author_id, pub_date)`` rows to the followers."""
+
+    by_author = defaultdict(list)
+    for post_id, author_id, pub_date in rows:
+        by_author[author_id].append((post_id, pub_date))
+    pulled = UserCounter.objects \
+        .filter(user_id__in=list(by_author), pulled_since__isnull=False) \
+        .values_list('user_id', flat=True)
+    followers = Follow.objects \
+        .filter(author_id__in=set(by_author) - set(pulled)) \
+        .values_list('user_id', 'author_id')
+    FeedEntry.objects.bulk_create(
+        (
+            FeedEntry(
+                user_id=user_id,
+                author_id=author_id,
+                post_id=post_id,
+                pub_date=pub_date,
+            )
+            for user_id, author_id in followers.iterator()
+            for post_id, pub_date in by_author[author_id]
+        ),
+        batch_size=settings.FEED_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def fan_out(post):
+    """Push a new post into the feeds of the author's followers."""
+
+    push([(post.pk, post.author_id, post.pub_date)])
+
+
+def copy_posts(user_ids, author_id, since=None):
+    """Copy the author's recent posts into the feeds of ``user_ids``.
+
+    Only posts published ``since`` then are copied if it is given.
+    """
+
+    posts = Post.objects.filter(author_id=author_id)
+    if since is not None:
+        posts = posts.filter(pub_date__gte=since)
+    posts = list(
+        posts
+        .order_by('-pub_date', '-pk')
+        .values_list('pk', 'pub_date')
+        [:settings.FEED_BACKFILL_POSTS]
+    )
+    FeedEntry.objects.bulk_create(
+        (
+            FeedEntry(
+                user_id=user_id,
+                author_id=author_id,
+                post_id=post_id,
+                pub_date=pub_date,
+            )
+            for user_id in user_ids
+            for post_id, pub_date in posts
+        ),
+        batch_size=settings.FEED_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def backfill(user_id, author_id):
+    """Copy the author's existing posts into a new follower's feed.
+
+    Pulled authors are copied too: their older posts must be there when
+    they are pushed again, which copies only the posts of pull mode.
+    """
+
+    copy_posts([user_id], author_id)
+
+
+def catch_up(author_id, since):
+    """Copy the posts the author wrote in pull mode to every follower."""
+
+    if is_pulled(author_id):
+        return
+    copy_posts(
+        Follow.objects
+        .filter(author_id=author_id)
+        .values_list('user_id', flat=True)
+        .iterator(),
+        author_id,
+        since,
+    )
+
+
+def _run(author_id, since):
+    try:
+        catch_up(author_id, since)
+    except Exception:
+        logger.exception('Catching up the followers of %s failed', author_id)
+    finally:
+        close_old_connections()
+
+
+def _submit(author_id, since):
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix='timeline')
+    _executor.submit(_run, author_id, since)
+
+
+def switch_modes(author_ids):
+    """Switch the authors whose follower counts crossed a threshold."""
+
+    counters = UserCounter.objects \
+        .filter(user_id__in=author_ids) \
+        .values_list('user_id', 'followers_count', 'pulled_since')
+    pulled, pushed = [], []
+    for author_id, count, since in counters:
+        if since is None and count > settings.FEED_PULL_THRESHOLD:
+            pulled.append(author_id)
+        elif since is not None and count <= settings.FEED_PUSH_THRESHOLD:
+            pushed.append((author_id, since))
+    if not pulled and not pushed:
+        return
+    UserCounter.objects \
+        .filter(user_id__in=pulled, pulled_since__isnull=True) \
+        .update(pulled_since=timezone.now())
+    UserCounter.objects \
+        .filter(user_id__in=[author_id for author_id, _ in pushed]) \
+        .update(pulled_since=None)
+    cache.delete(PULLED_AUTHORS_KEY.format(None))
+    bump_generation(FEED)
+    for author_id, since in pushed:
+        if settings.FEED_ASYNC:
+            transaction.on_commit(partial(_submit, author_id, since))
+        else:
+            catch_up(author_id, since)
+
+
+def prune(user_id, author_id):
+    """Drop the author's posts from a former follower's feed."""
+
+    FeedEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+class TimelinePaginator(CursorPaginator):
+    """Cursor paginator over the subscription feed of ``user``.
+
+    ``object_list`` is the queryset posts are loaded from. A page is a
+    k-way merge on ``(pub_date, id)`` of the pushed ``FeedEntry`` rows and
+    one keyset slice per pulled author the user follows.
+    """
+
+    def __init__(self, object_list, per_page, user, threshold=None,
+                 **kwargs):
+        kwargs.setdefault(
+            'generations', (FEED, follower_generation(user.pk)))
+        super().__init__(object_list, per_page, **kwargs)
+        self.user = user
+        self.threshold = threshold
+
+    def count_key(self):
+        return f'timeline:{self.user.pk}:{self.threshold}'
+
+    def compute_total(self):
+        pushed = FeedEntry.objects.filter(user=self.user).count()
+        # Posts pushed before their author crossed the threshold are
+        # already counted with the pushed ones.
+        pulled = self.object_list.filter(
+            author__following__user=self.user,
+            author_id__in=pulled_authors(self.threshold),
+        ).exclude(
+            pk__in=FeedEntry.objects
+            .filter(user=self.user)
+            .values('post_id'),
+        ).count()
+        return pushed + pulled
+
+    def pushed(self, position, reverse, limit):
+        entries = keyset_slice(
+            FeedEntry.objects.filter(user=self.user),
+            ('pub_date', 'post_id'),
+            position, reverse, 0, limit,
+        )
+        posts = self.object_list.in_bulk(
+            [entry.post_id for entry in entries])
+        return [posts[entry.post_id] for entry in entries
+                if entry.post_id in posts]
+
+    def pulled(self, position, reverse, limit):
+        authors = Follow.objects \
+            .filter(
+                user=self.user,
+                author_id__in=pulled_authors(self.threshold)) \
+            .values_list('author_id', flat=True)
+        return [
+            keyset_slice(
+                self.object_list.filter(author_id=author_id),
+                self.keys, position, reverse, 0, limit,
+            )
+            for author_id in authors
+        ]
+
+    def fetch(self, position=None, reverse=False, offset=0, limit=None):
+        # Every source has to provide offset + limit rows: any of them may
+        # own the whole page.
+        if limit is not None:
+            limit += offset
+        sources = [self.pushed(position, reverse, limit)]
+        sources += self.pulled(position, reverse, limit)
+        merged = heapq.merge(
+            *sources,
+            key=lambda post: (post.pub_date, post.pk),
+            reverse=not reverse,
+        )
+        return list(islice(unique(merged), offset, limit))
+
+
+def unique(posts):
+    """Skip posts pushed before their author crossed the threshold."""
+
+    seen = set()
+    for post in posts:
+        if post.pk not in seen:
+            seen.add(post.pk)
+            yield post
@@ -0,0 +1,185 @@
+"""Memory-bounded handling of uploaded images.
+
+``LimitedUploadHandler`` streams every upload to a temporary file in
+``IMAGE_UPLOAD_CHUNK_SIZE`` chunks, so at most one chunk of a file is
+held in memory, and stops writing files over ``IMAGE_UPLOAD_MAX_BYTES``
+(the rest of the body is still read and thrown away).
+
+Before Pillow decodes anything, ``check_upload`` (run by ``PostForm``
+ahead of its fields) rejects such files and reads only the image header
+to check the format and the pixel count against ``IMAGE_UPLOAD_FORMATS``
+and ``IMAGE_UPLOAD_MAX_PIXELS``, which stops decompression bombs.
+``normalize`` then re-encodes the image, downsized to ``IMAGE_MAX_SIDE``
+and without its metadata (EXIF, comments, text chunks), decoding JPEGs at
+a reduced scale where possible.
+
+``describe`` gives the size of an image and a tiny blurred copy of it as
+a data URI, stored on the post so that pages are laid out, and show
+something, without opening the file.
+"""
+import base64
+import io
+import tempfile
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from PIL import Image, ImageFilter, ImageOps
+
+# Image.info keys that survive re-encoding: the colour profile and the
+# transparent colour of palette images are not metadata.
+KEPT_INFO = ('icc_profile', 'transparency')
+
+EXIF_ORIENTATION = 0x0112
+
+
+class LimitedUploadHandler(TemporaryFileUploadHandler):
+    """Stream uploads to disk and mark the ones that are too large."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.chunk_size = settings.IMAGE_UPLOAD_CHUNK_SIZE
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+        self.too_large = False
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received <= settings.IMAGE_UPLOAD_MAX_BYTES:
+            return super().receive_data_chunk(raw_data, start)
+        if not self.too_large:
+            self.too_large = True
+            self.file.seek(0)
+            self.file.truncate()
+        return None
+
+    def file_complete(self, file_size):
+        upload = super().file_complete(file_size)
+        upload.too_large = self.too_large
+        return upload
+
+
+def open_upload(upload):
+    if hasattr(upload, 'temporary_file_path'):
+        return Image.open(upload.temporary_file_path())
+    upload.seek(0)
+    return Image.open(upload)
+
+
+def check_upload(upload):
+    """Validate size, format and dimensions of ``upload`` from its header.
+
+    Raise ``ValidationError`` for a file to reject. Files Pillow cannot
+    identify are left to ``forms.ImageField``.
+    """
+
+    limit = settings.IMAGE_UPLOAD_MAX_BYTES
+    if getattr(upload, 'too_large', False) or upload.size > limit:
+        raise ValidationError(
+            'Файл больше %(limit)s МБ.',
+            code='file_too_large',
+            params={'limit': round(limit / 2 ** 20, 1)},
+        )
+    try:
+        # Image.open only parses the header; pixels are decoded lazily.
+        with open_upload(upload) as image:
+            image_format, (width, height) = image.format, image.size
+    except Image.DecompressionBombError:
+        width = height = float('inf')
+        image_format = None
+    except Exception:
+        return
+    finally:
+        upload.seek(0)
+    if width * height > settings.IMAGE_UPLOAD_MAX_PIXELS:
+        raise ValidationError(
+            'Картинка больше %(limit)s мегапикселей.',
+            code='too_many_pixels',
+            params={'limit': settings.IMAGE_UPLOAD_MAX_PIXELS // 10 ** 6},
+        )
+    if image_format not in settings.IMAGE_UPLOAD_FORMATS:
+        raise ValidationError(
+            'Формат %(format)s не поддерживается.',
+            code='unsupported_format',
+            params={'format': image_format},
+        )
+
+
+def normalize(upload):
+    """Return ``upload`` downsized and stripped of metadata.
+
+    Animated images are returned as they are: re-encoding would keep
+    only their first frame.
+    """
+
+    image = open_upload(upload)
+    image_format = image.format
+    if getattr(image, 'is_animated', False):
+        image.close()
+        return upload
+    side = settings.IMAGE_MAX_SIDE
+    # thumbnail() lets the JPEG decoder scale down by up to 8 while it
+    # decodes, so a large photo is never held at full size.
+    image.thumbnail((side, side), Image.LANCZOS)
+    image = ImageOps.exif_transpose(image)
+    description = describe(image)
+    params = {
+        key: image.info[key] for key in KEPT_INFO if key in image.info
+    }
+    image.info = {}
+    if image_format == 'JPEG':
+        params['quality'] = settings.IMAGE_UPLOAD_QUALITY
+
+    # An anonymous temporary file: storage copies it in chunks and it is
+    # removed as soon as it is closed.
+    output = tempfile.TemporaryFile(dir=settings.FILE_UPLOAD_TEMP_DIR)
+    image.save(output, image_format, **params)
+    image.close()
+    size = output.tell()
+    output.seek(0)
+    normalized = UploadedFile(
+        output, upload.name, Image.MIME[image_format], size)
+    normalized.description = description
+    return normalized
+
+
+def describe(image):
+    """Return the ``Post`` image fields describing a Pillow ``image``."""
+
+    width, height = image.size
+    scale = settings.IMAGE_PLACEHOLDER_SIDE / max(width, height)
+    size = (max(round(width * scale), 1), max(round(height * scale), 1))
+    if image.mode == 'P':
+        image = image.convert('RGBA')
+    small = image.resize(size, Image.BILINEAR, reducing_gap=2.0)
+    small = small.convert('RGB').filter(ImageFilter.GaussianBlur(1))
+    output = io.BytesIO()
+    small.save(output, 'JPEG', quality=50)
+    encoded = base64.b64encode(output.getvalue()).decode()
+    return {
+        'image_width': width,
+        'image_height': height,
+        'image_placeholder': f'data:image/jpeg;base64,{encoded}',
+    }
+
+
+def describe_file(file):
+    """``describe`` an image file, decoding as little of it as possible."""
+
+    file.seek(0)
+    try:
+        with Image.open(file) as image:
+            width, height = image.size
+            if image.getexif().get(EXIF_ORIENTATION) in (5, 6, 7, 8):
+                width, height = height, width
+            side = settings.IMAGE_PLACEHOLDER_SIDE
+            # JPEGs are decoded at up to 1/8 scale: the placeholder is tiny.
+            image.draft('RGB', (side * 2, side * 2))
+            description = describe(ImageOps.exif_transpose(image))
+    finally:
+        file.seek(0)
+    description.update(image_width=width, image_height=height)
+    return description
@@ -6,8 +6,19 @@ app_name = 'posts'
 
 urlpatterns = [
     path('', views.index, name='index'),
+    path('more/', views.index_more, name='index_more'),
     path('group/<slug:slug>/', views.group_posts, name='group_list'),
+    path(
+        'group/<slug:slug>/more/',
+        views.group_posts_more,
+        name='group_list_more'
+    ),
     path('profile/<str:username>/', views.profile, name='profile'),
+    path(
+        'profile/<str:username>/more/',
+        views.profile_more,
+        name='profile_more'
+    ),
     path('posts/<int:post_id>/edit/', views.post_edit, name='post_edit'),
     path(
         'posts/<int:post_id>/comment/',
@@ -15,9 +26,16 @@ urlpatterns = [
         name='add_comment'
     ),
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
+    path(
+        'posts/<int:post_id>/comments/',
+        views.post_comments,
+        name='post_comments'
+    ),
     path('posts/<int:post_id>/remove/', views.post_remove, name='post_remove'),
     path('create/', views.post_create, name='post_create'),
+    path('search/', views.search, name='search'),
     path('follow/', views.follow_index, name='follow_index'),
+    path('follow/more/', views.follow_index_more, name='follow_index_more'),
     path(
         'profile/<str:username>/follow/',
         views.profile_follow,
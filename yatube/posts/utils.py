@@ -1,7 +1,246 @@
-from django.core.paginator import Paginator
+import base64
+import binascii
+import hashlib
+import json
+from math import ceil
 
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
 
-def make_paginator(objects, request, per_page):
-    paginator = Paginator(objects, per_page)
-    page_number = request.GET.get('page')
-    return paginator.get_page(page_number)
+from .generations import FEED, get_version
+
+LAST_PAGE = 'last'
+
+
+def dump_cursor(payload):
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode()
+
+
+def load_cursor(cursor):
+    """Return the decoded payload of ``cursor``; raise ValueError if bad."""
+
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+    except binascii.Error as error:
+        raise ValueError(str(error))
+    return json.loads(raw)
+
+
+def keyset_queryset(queryset, keys, position=None, reverse=False):
+    """Order ``queryset`` by ``keys`` and skip rows up to ``position``."""
+
+    date_key, id_key = keys
+    if position is not None:
+        value, pk = position
+        lookup = 'gt' if reverse else 'lt'
+        # The redundant inclusive bound keeps the predicate a plain range
+        # on the leading index column instead of an OR the planner may
+        # answer with a temporary sort.
+        queryset = queryset.filter(
+            Q(**{f'{date_key}__{lookup}e': value}),
+            Q(**{f'{date_key}__{lookup}': value})
+            | Q(**{f'{id_key}__{lookup}': pk}),
+        )
+    if reverse:
+        ordering = (date_key, id_key)
+    else:
+        ordering = (f'-{date_key}', f'-{id_key}')
+    return queryset.order_by(*ordering)
+
+
+def keyset_slice(queryset, keys, position=None, reverse=False,
+                 offset=0, limit=None):
+    """Slice ``queryset`` ordered by ``keys`` starting past ``position``."""
+
+    queryset = keyset_queryset(queryset, keys, position, reverse)
+    if limit is None:
+        return list(queryset[offset:])
+    return list(queryset[offset:offset + limit])
+
+
+class CursorPaginator(Paginator):
+    """Keyset paginator over ``keys`` in descending order.
+
+    ``keys`` is a pair of a date field and a unique tie breaker, e.g.
+    ``('pub_date', 'pk')``. Pages are addressed by opaque cursors that
+    hold the keys of the last (or first) row seen, so every page costs
+    one indexed range read without ``COUNT(*)`` or ``OFFSET``. Plain page
+    numbers are still accepted for old ``?page=N`` links.
+
+    The returned pages are ordinary ``Page`` objects with ``next_cursor``
+    and ``previous_cursor`` attributes. ``count`` reports only the rows
+    known from the walk so far, which is enough for ``Page`` to answer
+    ``has_next``/``has_previous`` without counting the whole table.
+
+    The full size of the feed is only needed to label and reach the last
+    page. It is exposed as ``total`` and cached until one of the cache
+    ``generations`` the feed depends on is bumped.
+    """
+
+    def __init__(self, object_list, per_page, keys=('pub_date', 'pk'),
+                 generations=(FEED,), **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.keys = keys
+        self.generations = generations
+        self._seen = 0
+
+    @property
+    def count(self):
+        return self._seen
+
+    @property
+    def num_pages(self):
+        return max(ceil(self.count / self.per_page), 1)
+
+    def count_key(self):
+        """Return a string identifying the counted feed."""
+
+        return str(self.object_list.query)
+
+    def compute_total(self):
+        return self.object_list.count()
+
+    @cached_property
+    def total(self):
+        digest = hashlib.md5(self.count_key().encode()).hexdigest()
+        version = get_version(*self.generations)
+        key = f'paginator:count:{version}:{digest}'
+        total = cache.get(key)
+        if total is None:
+            total = self.compute_total()
+            cache.set(key, total, settings.PAGINATOR_COUNT_TIMEOUT)
+        return max(total, self.count)
+
+    @property
+    def total_pages(self):
+        return max(ceil(self.total / self.per_page), 1)
+
+    def _make_page(self, rows, number, has_next):
+        self._seen = (number - 1) * self.per_page + len(rows) + has_next
+        page = Page(rows, number, self)
+        page.next_cursor = page.previous_cursor = None
+        if has_next:
+            page.next_cursor = self.encode_cursor(rows[-1], number + 1)
+        if number > 1:
+            page.previous_cursor = self.encode_cursor(
+                rows[0], number - 1, reverse=True)
+        return page
+
+    def dump_key(self, value):
+        return value.isoformat()
+
+    def load_key(self, raw):
+        """Parse a key dumped by ``dump_key``; return None if malformed."""
+
+        return parse_datetime(raw)
+
+    def encode_cursor(self, obj, number, reverse=False):
+        value, pk = (getattr(obj, key) for key in self.keys)
+        payload = {
+            'v': self.dump_key(value),
+            'k': pk,
+            'n': number,
+            'r': int(reverse),
+        }
+        return dump_cursor(payload)
+
+    def decode_cursor(self, cursor):
+        """Return ``(position, number, reverse)`` or None if malformed."""
+
+        try:
+            payload = load_cursor(cursor)
+            value = self.load_key(payload['v'])
+            position = (value, int(payload['k']))
+            number = max(int(payload['n']), 1)
+            reverse = bool(payload['r'])
+        except (ValueError, TypeError, KeyError):
+            return None
+        if value is None:
+            return None
+        return position, number, reverse
+
+    def fetch(self, position=None, reverse=False, offset=0, limit=None):
+        """Return up to ``limit`` objects strictly past ``position``.
+
+        Rows come in feed order (newest first) unless ``reverse`` is set.
+        """
+
+        return keyset_slice(self.object_list, self.keys, position,
+                            reverse, offset, limit)
+
+    def cursor_page(self, cursor):
+        decoded = self.decode_cursor(cursor)
+        if decoded is None:
+            return self.number_page(1)
+        position, number, reverse = decoded
+        rows = self.fetch(position, reverse, limit=self.per_page + 1)
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if not reverse:
+            return self._make_page(rows, number, has_more)
+        if not has_more or number == 1:
+            # Walked back to the head of the feed: restart from the top
+            # so the first page is always full.
+            return self.number_page(1)
+        rows.reverse()
+        return self._make_page(rows, number, True)
+
+    def last_page(self):
+        """Read the tail of the feed backwards from the oldest row."""
+
+        number = self.total_pages
+        if number == 1:
+            return self.number_page(1)
+        rows = self.fetch(
+            reverse=True, limit=self.total - (number - 1) * self.per_page)
+        rows.reverse()
+        return self._make_page(rows, number, False)
+
+    def number_page(self, number):
+        """Legacy ``?page=N`` access, kept for bookmarked links."""
+
+        offset = (number - 1) * self.per_page
+        rows = self.fetch(offset=offset, limit=self.per_page + 1)
+        if not rows and number > 1:
+            return self.number_page(1)
+        has_more = len(rows) > self.per_page
+        return self._make_page(rows[:self.per_page], number, has_more)
+
+    def get_cursor_page(self, cursor=None, number=None):
+        if cursor:
+            return self.cursor_page(cursor)
+        if number == LAST_PAGE:
+            return self.last_page()
+        try:
+            number = max(int(number), 1)
+        except (TypeError, ValueError):
+            number = 1
+        return self.number_page(number)
+
+
+def make_paginator(objects, request, per_page,
+                   paginator_class=CursorPaginator, **kwargs):
+    paginator = paginator_class(objects, per_page, **kwargs)
+    return paginator.get_cursor_page(
+        request.GET.get('cursor'),
+        request.GET.get('page'),
+    )
+
+
+def feed_cache_key(page_obj, user):
+    """Return the fragment cache key of a rendered page of post cards.
+
+    The key changes with the ``feed`` generation and with the posts on
+    the page. Cards show edit links to their author, so the viewer is
+    part of the key only on pages that hold the viewer's own posts.
+    """
+
+    ids = [post.pk for post in page_obj]
+    owner = any(post.author_id == user.pk for post in page_obj)
+    viewer = user.pk if owner else None
+    return f'{get_version(FEED)}:{viewer}:{ids}'
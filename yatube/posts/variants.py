@@ -0,0 +1,198 @@
+"""Responsive variants of post images.
+
+Each image is cropped to the card ratio and encoded at every width of
+``IMAGE_VARIANT_WIDTHS`` that does not upscale it, in every format of
+``IMAGE_VARIANT_FORMATS`` the installed Pillow can write (WebP first,
+JPEG as the fallback). Files are named after a hash of their content, so
+their URLs never change meaning and may be cached forever
+(``IMAGE_VARIANT_MAX_AGE``); identical output is stored once.
+
+The list of files is kept on the post as JSON in ``image_variants``,
+so templates render ``srcset`` from the row without touching storage.
+``StoredVariant`` maps each source image to its files, which are
+deleted with the source unless another source shares them.
+Variants are built by the thumbnail workers next to sorl thumbnails.
+"""
+import hashlib
+import io
+import json
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, features
+
+from . import invalidation
+from .models import Post, StoredVariant, post_image_storage
+
+DIRECTORY = 'variants'
+
+# Pillow format name, file extension and MIME type of each format.
+FORMATS = {
+    'webp': ('WEBP', 'webp', 'image/webp'),
+    'jpeg': ('JPEG', 'jpg', 'image/jpeg'),
+}
+
+
+def available_formats():
+    return [
+        name for name in settings.IMAGE_VARIANT_FORMATS
+        if name != 'webp' or features.check('webp')
+    ]
+
+
+def variant_widths(source_width):
+    """Return the configured widths that do not upscale the source."""
+
+    widths = sorted(settings.IMAGE_VARIANT_WIDTHS)
+    fitting = [width for width in widths if width <= source_width]
+    return fitting or widths[:1]
+
+
+def card_size(post):
+    """Return the intrinsic ``(width, height)`` of the card of ``post``.
+
+    It is worked out from the stored source width the way the variant
+    widths are, so no file is opened to lay the page out.
+    """
+
+    width = variant_widths(
+        post.image_width or max(settings.IMAGE_VARIANT_WIDTHS))[-1]
+    ratio_width, ratio_height = settings.IMAGE_VARIANT_RATIO
+    return width, round(width * ratio_height / ratio_width)
+
+
+def encode(image, name):
+    pil_format, _, _ = FORMATS[name]
+    output = io.BytesIO()
+    image.save(output, pil_format, quality=settings.IMAGE_VARIANT_QUALITY)
+    return output.getvalue()
+
+
+def store(data, name):
+    """Save ``data`` under its content hash; return the file name."""
+
+    _, extension, _ = FORMATS[name]
+    digest = hashlib.sha256(data).hexdigest()[:20]
+    filename = f'{DIRECTORY}/{digest}.{extension}'
+    if not default_storage.exists(filename):
+        default_storage.save(filename, ContentFile(data))
+    return filename
+
+
+def render(image_name):
+    """Encode and store the variants of ``image_name``.
+
+    Return the manifest ``{format: [[width, file name], ...]}``.
+    """
+
+    with post_image_storage.open(image_name) as source:
+        image = ImageOps.exif_transpose(Image.open(source))
+        image = image.convert('RGB')
+    ratio_width, ratio_height = settings.IMAGE_VARIANT_RATIO
+    manifest = {name: [] for name in available_formats()}
+    for width in variant_widths(image.width):
+        height = round(width * ratio_height / ratio_width)
+        resized = ImageOps.fit(image, (width, height), Image.LANCZOS)
+        for name in manifest:
+            manifest[name].append([width, store(encode(resized, name), name)])
+    return manifest
+
+
+def build(image_name, force=False):
+    """Record the variants of ``image_name`` on the posts showing it.
+
+    Posts sharing a stored image reuse variants already rendered for
+    one of them unless ``force`` is set. The cached pages of the posts
+    are bumped once the variants change.
+    """
+
+    posts = Post.objects.filter(image=image_name)
+    encoded = None
+    if not force:
+        encoded = posts \
+            .exclude(image_variants='') \
+            .values_list('image_variants', flat=True) \
+            .first()
+    if encoded is None:
+        changed = record(image_name, render(image_name))
+    else:
+        changed = record(image_name, json.loads(encoded))
+    if changed:
+        invalidation.bump_image(image_name)
+
+
+def record(image_name, manifest):
+    """Set the ``manifest`` made by ``render`` on the posts of the image.
+
+    Return the number of changed posts. ``updated_at`` is left alone, as
+    it is the time the post was edited; pages are not bumped either.
+    """
+
+    encoded = json.dumps(manifest, separators=(',', ':'))
+    StoredVariant.objects.bulk_create(
+        [
+            StoredVariant(source=image_name, name=name)
+            for files in manifest.values() for _, name in files
+        ],
+        ignore_conflicts=True,
+    )
+    return Post.objects \
+        .filter(image=image_name) \
+        .exclude(image_variants=encoded) \
+        .update(image_variants=encoded)
+
+
+def delete(image_name):
+    """Delete the variant files of the source ``image_name``.
+
+    Identical output of two images is stored once, so files another
+    source still has are kept.
+    """
+
+    stored = StoredVariant.objects.filter(source=image_name)
+    names = set(stored.values_list('name', flat=True))
+    if not names:
+        return
+    stored.delete()
+    kept = StoredVariant.objects \
+        .filter(name__in=names) \
+        .values_list('name', flat=True)
+    for name in names - set(kept):
+        default_storage.delete(name)
+
+
+def sources(post):
+    """Return what templates need to render the variants of ``post``.
+
+    That is ``{'sources': [(mime type, srcset)], 'srcset': ..., 'src':
+    ...}`` where the ``<img>`` gets the last (fallback) format and the
+    ``<source>`` tags the others, or None while there are no variants.
+    """
+
+    if not post.image_variants:
+        return None
+    try:
+        manifest = json.loads(post.image_variants)
+    except ValueError:
+        return None
+    formats = [
+        (FORMATS[name][2], files)
+        for name, files in manifest.items() if name in FORMATS and files
+    ]
+    if not formats:
+        return None
+    srcsets = [
+        (mime_type, ', '.join(
+            f'{default_storage.url(filename)} {width}w'
+            for width, filename in files
+        ))
+        for mime_type, files in formats
+    ]
+    _, largest = max(formats[-1][1])
+    return {
+        'sources': srcsets[:-1],
+        'srcset': srcsets[-1][1],
+        'src': default_storage.url(largest),
+        'sizes': settings.IMAGE_VARIANT_SIZES,
+    }
@@ -1,69 +1,178 @@
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.db.models import Count
+from django.db import transaction
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse_lazy
 from django.urls.base import reverse
 
+from . import thumbnails
+from .conditional import (group_condition, index_condition, post_condition,
+                          profile_condition)
+from .counters import get_counters
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User
-from .utils import make_paginator
+from .generations import (FEED, author_generation, group_generation,
+                          post_generation, tag_request)
+from .models import Comment, Follow, Group, Post, User
+from .search import SearchPaginator
+from .timeline import TimelinePaginator
+from .utils import CursorPaginator, feed_cache_key, make_paginator
 
+COMMENT_KEYS = ('created', 'pk')
 
+
+@index_condition
 def index(request):
 
-    posts = Post.objects.all().annotate(comments_count=Count('comments'))
+    tag_request(request, FEED)
+    posts = Post.objects.select_related('author', 'group')
     page_obj = make_paginator(posts, request, settings.RECORDS_PER_PAGE)
     template = 'posts/index.html'
     context = {
         'page_obj': page_obj,
+        'feed_cache_key': feed_cache_key(page_obj, request.user),
+        'feed_cache_timeout': settings.FEED_CACHE_TIMEOUT,
+        'more_url': reverse('posts:index_more'),
     }
 
     return render(request, template, context)
 
 
+@group_condition
 def group_posts(request, slug):
 
+    tag_request(request, group_generation(slug))
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all().annotate(comments_count=Count('comments'))
-    page_obj = make_paginator(posts, request, settings.RECORDS_PER_PAGE)
+    posts = group.posts.select_related('author', 'group')
+    page_obj = make_paginator(
+        posts,
+        request,
+        settings.RECORDS_PER_PAGE,
+        generations=(group_generation(group.slug),),
+    )
     template = 'posts/group_list.html'
     context = {
         'group': group,
         'page_obj': page_obj,
+        'more_url': reverse('posts:group_list_more', args=[slug]),
     }
 
     return render(request, template, context)
 
 
+@profile_condition
 def profile(request, username):
-    selected_user = get_object_or_404(User, username=username)
-    posts = selected_user \
-        .posts.all() \
-        .annotate(comments_count=Count('comments'))
-    count = selected_user.posts.count()
-    page_obj = make_paginator(posts, request, settings.RECORDS_PER_PAGE)
+    selected_user = get_object_or_404(
+        User.objects.select_related('counters'),
+        username=username
+    )
+    tag_request(request, author_generation(selected_user.pk))
+    posts = selected_user.posts.select_related('author', 'group')
+    counters = get_counters(selected_user)
+    page_obj = make_paginator(
+        posts,
+        request,
+        settings.RECORDS_PER_PAGE,
+        generations=(author_generation(selected_user.pk),),
+    )
+    tag_request(request, *(
+        group_generation(post.group.slug) for post in page_obj if post.group
+    ))
     following = False
     if request.user.is_authenticated:
         following = selected_user.following.filter(user=request.user).exists()
     template = 'posts/profile.html'
     context = {
         'selected_user': selected_user,
-        'count': count,
+        'count': counters.posts_count,
+        'counters': counters,
         'page_obj': page_obj,
         'following': following,
+        'more_url': reverse('posts:profile_more', args=[username]),
     }
 
     return render(request, template, context)
 
 
+def render_more(request, page_obj):
+    """Render only the cards of ``page_obj`` for infinite scroll.
+
+    The next cursor is sent both in the "more" link of the fragment and
+    in the ``X-Next-Cursor`` header.
+    """
+
+    context = {
+        'page_obj': page_obj,
+        'more_url': request.path,
+    }
+    response = render(request, 'includes/post_list.html', context)
+    response['X-Next-Cursor'] = page_obj.next_cursor or ''
+    return response
+
+
+@index_condition
+def index_more(request):
+    tag_request(request, FEED)
+    posts = Post.objects.select_related('author', 'group')
+    return render_more(
+        request, make_paginator(posts, request, settings.RECORDS_PER_PAGE))
+
+
+@group_condition
+def group_posts_more(request, slug):
+    tag_request(request, group_generation(slug))
+    group = get_object_or_404(Group, slug=slug)
+    posts = group.posts.select_related('author', 'group')
+    return render_more(
+        request, make_paginator(posts, request, settings.RECORDS_PER_PAGE))
+
+
+@profile_condition
+def profile_more(request, username):
+    selected_user = get_object_or_404(User, username=username)
+    tag_request(request, author_generation(selected_user.pk))
+    posts = selected_user.posts.select_related('author', 'group')
+    page_obj = make_paginator(
+        posts,
+        request,
+        settings.RECORDS_PER_PAGE,
+        generations=(author_generation(selected_user.pk),),
+    )
+    tag_request(request, *(
+        group_generation(post.group.slug) for post in page_obj if post.group
+    ))
+    return render_more(request, page_obj)
+
+
+@login_required
+def follow_index_more(request):
+    return render_more(request, make_paginator(
+        Post.objects.select_related('author', 'group'),
+        request,
+        settings.RECORDS_PER_PAGE,
+        TimelinePaginator,
+        user=request.user,
+    ))
+
+
+@post_condition
 def post_detail(request, post_id):
-    selected_post = get_object_or_404(Post, pk=post_id)
+    tag_request(request, post_generation(post_id))
+    selected_post = get_object_or_404(
+        Post.objects.select_related('author__counters', 'group'),
+        pk=post_id
+    )
+    tag_request(request, author_generation(selected_post.author_id))
+    if selected_post.group:
+        tag_request(request, group_generation(selected_post.group.slug))
     post_preview = selected_post.text[:30]
-    count = selected_post.author.posts.count()
+    count = get_counters(selected_post.author).posts_count
     template_name = 'posts/post_detail.html'
     form_comment = CommentForm()
-    comments = selected_post.comments.all()
+    comments = CursorPaginator(
+        selected_post.comments.select_related('author'),
+        settings.COMMENTS_PER_PAGE,
+        keys=COMMENT_KEYS,
+    ).get_cursor_page()
     context = {
         'post': selected_post,
         'preview': post_preview,
@@ -75,6 +184,54 @@ def post_detail(request, post_id):
     return render(request, template_name, context)
 
 
+def post_comments(request, post_id):
+    """Next page of comments as an HTML fragment."""
+
+    tag_request(request, post_generation(post_id))
+    comments = Comment.objects \
+        .filter(post_id=post_id) \
+        .select_related('author')
+    page_obj = make_paginator(
+        comments,
+        request,
+        settings.COMMENTS_PER_PAGE,
+        keys=COMMENT_KEYS,
+    )
+    if not page_obj:
+        # Only an empty page may belong to a missing post.
+        get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    template_name = 'includes/comment_list.html'
+    context = {
+        'post_id': post_id,
+        'comments': page_obj,
+    }
+
+    return render(request, template_name, context)
+
+
+def search(request):
+    """Posts matching ``?q=``, best matches first.
+
+    Not tagged for the page cache: free-form queries would only fill it.
+    """
+
+    query = request.GET.get('q', '').strip()
+    page_obj = make_paginator(
+        Post.objects.select_related('author', 'group'),
+        request,
+        settings.RECORDS_PER_PAGE,
+        SearchPaginator,
+        query=query,
+    )
+    template = 'posts/search.html'
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+    }
+
+    return render(request, template, context)
+
+
 @login_required
 def post_create(request):
     """Add new post."""
@@ -86,7 +243,9 @@ def post_create(request):
         if form.is_valid():
             new_post = form.save(commit=False)
             new_post.author = request.user
-            new_post.save()
+            with transaction.atomic():
+                new_post.save()
+                thumbnails.enqueue(new_post.image)
             succses_url = reverse_lazy(
                 'posts:profile',
                 args=[request.user.username]
@@ -110,7 +269,7 @@ def post_edit(request, post_id):
 
     edited_post = get_object_or_404(Post, pk=post_id)
 
-    if edited_post.author != request.user:
+    if edited_post.author_id != request.user.pk:
         return redirect(reverse_lazy('posts:post_detail', args=[post_id]))
 
     template_name = 'posts/create_post.html'
@@ -122,7 +281,10 @@ def post_edit(request, post_id):
     )
 
     if form.is_valid():
-        form.save()
+        with transaction.atomic():
+            form.save()
+            if 'image' in form.changed_data:
+                thumbnails.enqueue(edited_post.image)
         return redirect(reverse_lazy('posts:post_detail', args=[post_id]))
 
     context = {
@@ -135,11 +297,12 @@ def post_edit(request, post_id):
 
 
 @login_required
+@transaction.atomic
 def post_remove(request, post_id):
     """Delete post."""
 
     deleted_post = get_object_or_404(Post, pk=post_id)
-    if deleted_post.author != request.user:
+    if deleted_post.author_id != request.user.pk:
         return redirect(reverse_lazy('posts:post_detail', args=[post_id]))
 
     Post.objects.filter(pk=post_id).delete()
@@ -148,6 +311,7 @@ def post_remove(request, post_id):
 
 
 @login_required
+@transaction.atomic
 def add_comment(reqest, post_id):
     """Add a comment to the post."""
 
@@ -167,21 +331,24 @@ def add_comment(reqest, post_id):
 def follow_index(request):
     """View subscriptions."""
 
-    user = User.objects.get(username=request.user.username)
-    posts = Post \
-        .objects \
-        .filter(author__following__user=user) \
-        .annotate(comments_count=Count('comments'))
-    page_obj = make_paginator(posts, request, settings.RECORDS_PER_PAGE)
+    page_obj = make_paginator(
+        Post.objects.select_related('author', 'group'),
+        request,
+        settings.RECORDS_PER_PAGE,
+        TimelinePaginator,
+        user=request.user,
+    )
     template = 'posts/follow.html'
     context = {
         'page_obj': page_obj,
+        'more_url': reverse('posts:follow_index_more'),
     }
 
     return render(request, template, context)
 
 
 @login_required
+@transaction.atomic
 def profile_follow(request, username):
     """Add subscription."""
 
@@ -200,6 +367,7 @@ def profile_follow(request, username):
 
 
 @login_required
+@transaction.atomic
 def profile_unfollow(request, username):
     """Remove subscription."""
 
@@ -0,0 +1,12 @@
+// Ссылки «Показать ещё» с атрибутом data-more подгружают HTML-фрагмент
+// следующей страницы и заменяются им.
+document.addEventListener('click', function (event) {
+  const link = event.target.closest('a[data-more]');
+  if (!link) {
+    return;
+  }
+  event.preventDefault();
+  fetch(link.href)
+    .then(function (response) { return response.text(); })
+    .then(function (html) { link.outerHTML = html; });
+});
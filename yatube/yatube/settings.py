@@ -47,6 +47,7 @@ INSTALLED_APPS = [
     'users.apps.UsersConfig',
     'core.apps.CoreConfig',
     'about.apps.AboutConfig',
+    'api.apps.ApiConfig',
     'sorl.thumbnail',
     'debug_toolbar',
 
@@ -61,6 +62,7 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'debug_toolbar.middleware.DebugToolbarMiddleware',
+    'posts.middleware.AnonymousPageCacheMiddleware',
 ]
 
 ROOT_URLCONF = 'yatube.urls'
@@ -150,12 +152,70 @@ ADMINS = ['admin@mysite.ru', 'gorvas53@yandex.ru']
 MANAGERS = ['manger1@mysite.ru', 'manager2@mysite.ru']
 
 RECORDS_PER_PAGE = 10
+COMMENTS_PER_PAGE = 20
+
+API_PAGE_SIZE = 100
+API_MAX_PAGE_SIZE = 1000
+
+# Cached feed sizes are also dropped whenever posts or follows change.
+PAGINATOR_COUNT_TIMEOUT = 60 * 60 * 24
+# Rendered feed fragments are versioned by the same generation.
+FEED_CACHE_TIMEOUT = 60 * 60 * 24
+# Whole pages served to anonymous visitors, purged by the same generations.
+PAGE_CACHE_TIMEOUT = 60 * 60 * 24
+# Row counts of admin changelists, which have no generation to follow.
+ADMIN_COUNT_TIMEOUT = 60 * 5
+
+# Authors with more followers are pulled into feeds at read time
+# instead of being fanned out to every follower on write.
+FEED_PULL_THRESHOLD = 10000
+# Pulled authors are pushed again only at this many followers or fewer.
+FEED_PUSH_THRESHOLD = 9000
+# Copy posts written in pull mode to the followers in a background thread.
+FEED_ASYNC = True
+FEED_PULLED_CACHE_TIMEOUT = 60
+FEED_BATCH_SIZE = 500
+# Older posts of an author copied into the feed of a new follower.
+FEED_BACKFILL_POSTS = 1000
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Thumbnails of post images used by the templates: name -> (geometry,
+# sorl options). They are made by a background worker pool after upload.
+POST_THUMBNAILS = {
+    'card': ('960x339', {'crop': 'center', 'upscale': True}),
+}
+THUMBNAIL_ASYNC = True
+THUMBNAIL_WORKERS = 2
+# Thumbnail records kept in process memory in front of sorl's store.
+THUMBNAIL_LRU_SIZE = 2048
+
+# Responsive variants of post images (see posts.variants): widths of the
+# srcset, the crop ratio of a card, formats in order of preference with
+# the fallback last, and how long browsers may cache the hashed files.
+IMAGE_VARIANT_WIDTHS = (320, 640, 960)
+IMAGE_VARIANT_RATIO = (960, 339)
+IMAGE_VARIANT_FORMATS = ('webp', 'jpeg')
+IMAGE_VARIANT_QUALITY = 80
+IMAGE_VARIANT_SIZES = '(max-width: 992px) 100vw, 960px'
+IMAGE_VARIANT_MAX_AGE = 60 * 60 * 24 * 365
+
+# Uploads are streamed to temporary files in chunks (see posts.uploads)
+# and post images are checked from their header before being decoded.
+FILE_UPLOAD_HANDLERS = ['posts.uploads.LimitedUploadHandler']
+IMAGE_UPLOAD_CHUNK_SIZE = 64 * 1024
+IMAGE_UPLOAD_MAX_BYTES = 10 * 1024 * 1024
+IMAGE_UPLOAD_MAX_PIXELS = 40 * 10 ** 6
+IMAGE_UPLOAD_FORMATS = ('JPEG', 'PNG', 'GIF', 'WEBP')
+# Larger originals are downsized on upload; re-encoding strips metadata.
+IMAGE_MAX_SIDE = 2560
+IMAGE_UPLOAD_QUALITY = 90
+# Longer side of the blurred placeholder stored on each post (pixels).
+IMAGE_PLACEHOLDER_SIDE = 16
+
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
@@ -1,7 +1,12 @@
+import os
+import re
+
 from django.conf import settings
 from django.conf.urls.static import static
 from django.contrib import admin
-from django.urls import include, path
+from django.urls import include, path, re_path
+from django.views.decorators.cache import cache_control
+from django.views.static import serve
 
 urlpatterns = [
     path('', include('posts.urls', namespace='posts')),
@@ -10,6 +15,7 @@ urlpatterns = [
     path('auth/', include('users.urls', namespace='users')),
     path('auth/', include('django.contrib.auth.urls')),
     path('about/', include('about.urls', namespace='about')),
+    path('api/', include('api.urls', namespace='api')),
 ]
 
 handler404 = 'core.views.page_not_found'
@@ -19,6 +25,22 @@ handler403 = 'core.views.permission_denied'
 if settings.DEBUG:
     import debug_toolbar
 
+    from posts.variants import DIRECTORY as VARIANTS
+
+    # Variant names are content hashes, so they may be cached forever.
+    # The web server serving MEDIA_ROOT in production must do the same.
+    urlpatterns += [
+        re_path(
+            r'^{}{}/(?P<path>.*)$'.format(
+                re.escape(settings.MEDIA_URL.lstrip('/')), VARIANTS),
+            cache_control(
+                public=True,
+                max_age=settings.IMAGE_VARIANT_MAX_AGE,
+                immutable=True,
+            )(serve),
+            {'document_root': os.path.join(settings.MEDIA_ROOT, VARIANTS)},
+        ),
+    ]
     urlpatterns += static(
         settings.MEDIA_URL, document_root=settings.MEDIA_ROOT
     )